@@ -12,7 +12,14 @@ from .extensions import (
     ma,
     login_manager,
     bcrypt,
-    mail
+    mail,
+    token_cache,
+    hasher,
+    query_instrumentation,
+    engine_tuning,
+    dispatcher,
+    mail_batcher,
+    todo_counters
 )
 
 from webargs.flaskparser import use_args
@@ -20,23 +27,28 @@ from webargs.flaskparser import use_args
 from app.utils import decode_jwt
 from app.utils.views_utils import json_response_with_error
 from app.utils.user_utils import user_login_args
+from app.utils.password_utils import HasherBusyError
 
 from app.models.user import User
+from app.models.outbox import OutboxMessage  # noqa: F401
+from app.models.watermark import Watermark  # noqa: F401
 
 from .views.index_view import IndexView
 from .views.users_views import UsersView
 from .views.cards_views import CardsView
 from .views.todos_views import TodosView
+from .views.sync_views import SyncView
 
 # Load .env file
 dotenv_path = join(dirname(__file__), '../.env')
 load_dotenv(dotenv_path)
 
 
-def create_app():
+def create_app(settings_override=None):
     """
     Create a Flask app using the app factory pattern.
 
+    :param settings_override: Dictionary of settings overriding the config
     :return: Flask app
     """
 
@@ -48,13 +60,23 @@ def create_app():
     app.config.from_pyfile('config.py')
     app.config['MODE'] = mode
 
+    if settings_override:
+        app.config.update(settings_override)
+
     # Register extensions
     register_extensions(app, [
         db,
         ma,
         login_manager,
         bcrypt,
-        mail
+        mail,
+        token_cache,
+        hasher,
+        query_instrumentation,
+        engine_tuning,
+        dispatcher,
+        mail_batcher,
+        todo_counters
     ])
 
     # App helper setup
@@ -96,6 +118,7 @@ def register_views(app):
     UsersView.register(app, route_prefix='/api/')
     CardsView.register(app, route_prefix='/api/')
     TodosView.register(app, route_prefix='/api/')
+    SyncView.register(app, route_prefix='/api/')
 
 
 def register_error_handler(app):
@@ -145,6 +168,27 @@ def register_error_handler(app):
             message='Authentication failed.'
         )
 
+    @app.errorhandler(HasherBusyError)
+    def handle_hasher_busy(error):
+        """
+        Return 503 when password hashing is saturated.
+
+        :param error: Errors
+        :return: Error response
+        """
+
+        response, code = json_response_with_error(
+            status='unavailable',
+            code=503,
+            errors={
+                'server': ['Too many requests in progress.']
+            },
+            message='Service is busy, please try again shortly.'
+        )
+        response.headers['Retry-After'] = '1'
+
+        return response, code
+
 
 def setup_app_helper(app):
     # Login user
@@ -161,12 +205,25 @@ def setup_app_helper(app):
 
         access_token = args['Access-Token']
 
+        # Use cached user without touching the database
+        cache_state = token_cache.get(access_token)
+        if cache_state is not None:
+            return User.from_cache_state(cache_state)
+
+        # Users invalidated while the row loads are not cached
+        generation = token_cache.generation
+
         try:
             # Decode payload
             payload = decode_jwt(access_token)
 
-            return User.query.filter_by(email=payload['email'],
+            user = User.query.filter_by(email=payload['email'],
                                         secret_key=payload['secret']).first()
 
+            if user:
+                token_cache.set(access_token, user.id, user.cache_state(), generation)
+
+            return user
+
         except Exception as e:
             return None
@@ -1,10 +1,14 @@
+import logging
 import os
 
 from app import create_app
+from app.models.outbox import OutboxMessage
 
 from celery import Celery
 
 
+logger = logging.getLogger(__name__)
+
 # Tasks list
 CELERY_TASK_LIST = []
 
@@ -39,7 +43,21 @@ def make_celery(app):
 
         def __call__(self, *args, **kwargs):
             with app.app_context():
-                return TaskBase.__call__(self, *args, **kwargs)
+                # Outbox messages may be published more than once, run them once
+                message_id = OutboxMessage.message_id(self.request.id)
+                if message_id is not None and not OutboxMessage.claim(message_id):
+                    logger.info('Skipping duplicate delivery of %s', self.request.id)
+                    return None
+
+                # Run directly, TaskBase.__call__ would hide the worker request
+                # and with it the task id and retry count from the task
+                try:
+                    return self.run(*args, **kwargs)
+                except Exception:
+                    # Retries keep the task id and need the claim back
+                    if message_id is not None:
+                        OutboxMessage.release(message_id)
+                    raise
     celery.Task = ContextTask
     return celery
 
@@ -1,11 +1,26 @@
-from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
 from flask_mail import Mail
 
-db = SQLAlchemy()
+from app.utils.cache_utils import TokenCache
+from app.utils.counter_utils import TodoCounters
+from app.utils.dispatch_utils import TaskDispatcher
+from app.utils.engine_utils import EngineTuning
+from app.utils.mail_utils import MailBatcher
+from app.utils.password_utils import PasswordHasher
+from app.utils.routing_utils import RoutingSQLAlchemy
+from app.utils.sql_utils import QueryInstrumentation
+
+db = RoutingSQLAlchemy()
 ma = Marshmallow()
 login_manager = LoginManager()
 bcrypt = Bcrypt()
 mail = Mail()
+token_cache = TokenCache()
+hasher = PasswordHasher()
+query_instrumentation = QueryInstrumentation()
+engine_tuning = EngineTuning()
+dispatcher = TaskDispatcher()
+mail_batcher = MailBatcher()
+todo_counters = TodoCounters()
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from app.extensions import db
 
 
@@ -8,10 +10,10 @@ class ModelMixin(object):
 
     # Common fields
     id = db.Column(db.Integer, primary_key=True)
-    date_created = db.Column(db.DateTime, default=db.func.current_timestamp())
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
     date_modified = db.Column(db.DateTime,
-                              default=db.func.current_timestamp(),
-                              onupdate=db.func.current_timestamp())
+                              default=datetime.utcnow,
+                              onupdate=datetime.utcnow)
 
     def save(self):
         """
@@ -1,20 +1,42 @@
-from app.extensions import db
+from app.extensions import db, todo_counters
+from sqlalchemy import event, inspect
+from sqlalchemy.orm.attributes import set_committed_value
 
 from . import ModelMixin
 from .todo import Todo
+from .tombstone import Tombstone
+
 
 class Card(db.Model, ModelMixin):
     __tablename__ = 'cards'
+    __table_args__ = (
+        db.Index('ix_cards_owner_id_date_modified_id', 'owner_id', 'date_modified', 'id'),
+        db.Index('ix_cards_owner_id_parent_card_id', 'owner_id', 'parent_card_id'),
+        db.Index('ix_cards_parent_card_id', 'parent_card_id'),
+    )
 
     # Card table fields
     title = db.Column(db.String(255), nullable=False)
     note = db.Column(db.Text, nullable=True)
     parent_card_id = db.Column(db.Integer, db.ForeignKey('cards.id', ondelete='CASCADE'), nullable=True)
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # Byte order collation, so the path index serves path_startswith ranges
+    path = db.Column(db.String(512).with_variant(db.String(512, collation='C'), 'postgresql'),
+                     index=True, nullable=True)
+
+    # Todo counters of the card itself, see TodoCounters
+    todos_total = db.Column(db.Integer, default=0, nullable=False)
+    todos_completed = db.Column(db.Integer, default=0, nullable=False)
+    todos_delayed = db.Column(db.Integer, default=0, nullable=False)
+
+    # Relationships, eager loading is chosen per endpoint with query options
+    child_cards = db.relationship('Card', cascade='all', backref=db.backref('parent_card', remote_side='Card.id'),
+                                  order_by='Card.id')
+    todos = db.relationship('Todo', cascade='all, delete-orphan', backref='card', order_by='Todo.id')
 
-    # Relationships
-    child_cards = db.relationship('Card', cascade='all', backref=db.backref('parent_card', remote_side='Card.id'), lazy='dynamic')
-    todos = db.relationship('Todo', cascade='all, delete-orphan', backref='card', lazy='dynamic')
+    # Query counterparts of the relationships, for filtered sub-queries
+    child_cards_query = db.relationship('Card', lazy='dynamic', viewonly=True)
+    todos_query = db.relationship('Todo', lazy='dynamic', viewonly=True)
 
     def __init__(self, owner_id, title, note=None, parent_card_id=None):
         """
@@ -37,25 +59,177 @@ class Card(db.Model, ModelMixin):
         """
         return '<Card %r>' % self.title
 
+    @staticmethod
+    def build_path(card_id, parent_path=None):
+        """
+        Build materialized path of a card.
+
+        :param card_id: Card ID
+        :param parent_path: Parent card path
+        :return: Path string, e.g. '/1/5/9/'
+        """
+        return (parent_path or '/') + str(card_id) + '/'
+
+    @staticmethod
+    def path_startswith(path):
+        """
+        Filter criteria matching cards whose path starts with a path.
+
+        Written as a range instead of LIKE so a plain b-tree index on the
+        path serves it. The range relies on byte order, which is why the
+        path column uses the C collation on PostgreSQL, SQLite compares
+        bytes by default.
+        :param path: Path prefix, e.g. '/1/5/'
+        :return: Filter criteria
+        """
+        # Paths only hold digits and slashes, '0' sorts right after '/'
+        return db.and_(Card.path >= path, Card.path < path[:-1] + '0')
+
+    def tree_path(self):
+        """
+        Materialized path of the card. Cards created before paths existed
+        get the paths of their owner's whole tree filled in first, so
+        subtree queries never miss descendants without a path.
+        :return: Path string
+        """
+        if self.path is None:
+            cards = Card.__table__
+
+            Card.fill_paths(db.session, self.owner_id)
+            path = db.session.scalar(db.select([cards.c.path]).where(cards.c.id == self.id))
+
+            # Cards caught in a parent cycle have no path to their root
+            set_committed_value(self, 'path', path or Card.build_path(self.id))
+
+        return self.path
+
+    @property
+    def ancestor_ids(self):
+        """
+        Ancestor card IDs from the root card down to the parent card.
+        :return: List of card IDs
+        """
+        return [int(i) for i in self.tree_path().strip('/').split('/')[:-1]]
+
+    def descendants(self):
+        """
+        Query all cards below this card.
+        :return: Query
+        """
+        return Card.query.filter(Card.path_startswith(self.tree_path()),
+                                 Card.id != self.id)
+
+    def subtree(self):
+        """
+        Query this card along with all cards below it.
+        :return: Query
+        """
+        return Card.query.filter(Card.path_startswith(self.tree_path()))
+
+    def ancestors(self):
+        """
+        Query all cards above this card.
+        :return: Query
+        """
+        return Card.query.filter(Card.id.in_(self.ancestor_ids))
+
+    def delete_subtree(self):
+        """
+        Delete this card, all cards below it and their todo lists with
+        set-based statements, without loading any of them into the session.
+        Deletions are recorded as tombstones for sync.
+        :return: Dictionary with the number of deleted cards and todos
+        """
+        cards = Card.__table__
+        todos = Todo.__table__
+
+        in_subtree = Card.path_startswith(self.tree_path())
+        subtree_ids = db.select([cards.c.id]).where(in_subtree)
+
+        # Subtree counters come off the owner counters
+        total, completed = db.session.execute(
+            db.select([db.func.coalesce(db.func.sum(cards.c.todos_total), 0),
+                       db.func.coalesce(db.func.sum(cards.c.todos_completed), 0)])
+            .where(in_subtree)
+        ).first()
+
+        Tombstone.bury('todo', Todo, todos.c.card_id.in_(subtree_ids))
+        Tombstone.bury('card', Card, in_subtree)
+
+        deleted_todos = db.session.execute(
+            todos.delete().where(todos.c.card_id.in_(subtree_ids))
+        ).rowcount
+        deleted_cards = db.session.execute(
+            cards.delete().where(in_subtree)
+        ).rowcount
+
+        todo_counters.update(db.session, {('user', self.owner_id): (-total, -completed)})
+
+        # The row is gone, keep the session from flushing the object
+        db.session.expunge(self)
+
+        return {
+            'cards': deleted_cards,
+            'todos': deleted_todos
+        }
+
+    @staticmethod
+    def rebuild_paths():
+        """
+        Rebuild materialized paths of every card, one statement per tree level.
+        :return: Number of updated cards
+        """
+        db.session.execute(Card.__table__.update().values(path=None))
+
+        return Card.fill_paths(db.session)
+
+    @staticmethod
+    def fill_paths(connection, owner_id=None):
+        """
+        Fill in missing materialized paths, one statement per tree level.
+        :param connection: Database connection or session
+        :param owner_id: Only fill cards of this owner
+        :return: Number of updated cards
+        """
+        cards = Card.__table__
+        parents = cards.alias('parents')
+
+        missing = cards.update().where(cards.c.path.is_(None))
+        if owner_id is not None:
+            missing = missing.where(cards.c.owner_id == owner_id)
+
+        # Top level cards
+        result = connection.execute(
+            missing.where(cards.c.parent_card_id.is_(None))
+            .values(path='/' + db.cast(cards.c.id, db.String) + '/')
+        )
+        total = updated = result.rowcount
+
+        # Walk down the tree one level at a time
+        while updated:
+            parent_path = db.select([parents.c.path]) \
+                .where(parents.c.id == cards.c.parent_card_id) \
+                .as_scalar()
+            result = connection.execute(
+                missing.where(cards.c.parent_card_id.isnot(None))
+                .where(parent_path.isnot(None))
+                .values(path=parent_path + db.cast(cards.c.id, db.String) + '/')
+            )
+            updated = result.rowcount
+            total += updated
+
+        return total
+
     def is_parent_of(self, child_card_id):
         """
-        Check if card has a child with ID of the child card.
+        Check if card is the same card or an ancestor of the child card.
         :param child_card_id: Child card ID
         :return: Boolean
         """
 
-        # Get child cards
-        child_cards = self.child_cards.all()
-
-        # Iterate through child cards and check parent ID
-        for child_card in child_cards:
-            if child_card.id == child_card_id:
-                return True
+        count = self.subtree().filter(Card.id == child_card_id).count()
 
-            # Check ID inside nested child cards
-            return child_card.is_parent_of(child_card_id)
-
-        return False
+        return count > 0
 
     def change_parent(self, parent_card_id):
         """
@@ -70,3 +244,71 @@ class Card(db.Model, ModelMixin):
             return True
 
         return False
+
+
+def stored_path(connection, card_id, owner_id):
+    """
+    Stored path of a card, filling in missing paths of the owner's cards
+    first.
+    :param connection: Database connection
+    :param card_id: Card ID
+    :param owner_id: Card owner ID
+    :return: Path string
+    """
+    cards = Card.__table__
+    query = db.select([cards.c.path]).where(cards.c.id == card_id)
+
+    path = connection.scalar(query)
+    if path is None:
+        Card.fill_paths(connection, owner_id)
+        path = connection.scalar(query)
+
+    return path
+
+
+@event.listens_for(Card, 'after_insert')
+def set_card_path(mapper, connection, target):
+    """
+    Store materialized path of the newly created card.
+    """
+    cards = Card.__table__
+
+    parent_path = None
+    if target.parent_card_id:
+        parent_path = stored_path(connection, target.parent_card_id, target.owner_id)
+
+    path = Card.build_path(target.id, parent_path)
+    connection.execute(
+        cards.update().where(cards.c.id == target.id).values(path=path)
+    )
+    set_committed_value(target, 'path', path)
+
+
+@event.listens_for(Card, 'after_update')
+def move_card_path(mapper, connection, target):
+    """
+    Rewrite materialized paths of the whole subtree in bulk when a card
+    moves to another parent.
+    """
+    history = inspect(target).attrs.parent_card_id.history
+    if not history.has_changes():
+        return
+
+    cards = Card.__table__
+
+    parent_path = None
+    if target.parent_card_id:
+        parent_path = stored_path(connection, target.parent_card_id, target.owner_id)
+
+    new_path = Card.build_path(target.id, parent_path)
+
+    # Cards without a stored path are filled in under their new parent
+    old_path = target.path or stored_path(connection, target.id, target.owner_id) or new_path
+
+    connection.execute(
+        cards.update()
+        .where(Card.path_startswith(old_path))
+        .values(path=db.literal(new_path) +
+                db.func.substr(cards.c.path, len(old_path) + 1))
+    )
+    set_committed_value(target, 'path', new_path)
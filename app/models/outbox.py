@@ -0,0 +1,121 @@
+import json
+
+from datetime import datetime
+
+from app.extensions import db
+
+from . import ModelMixin
+
+
+class OutboxMessage(db.Model, ModelMixin):
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        # Pending messages in id order, what the relay scans
+        db.Index('ix_outbox_pending', 'id',
+                 postgresql_where=db.text('dispatched_at IS NULL'),
+                 sqlite_where=db.text('dispatched_at IS NULL')),
+    )
+
+    # Outbox table fields
+    task = db.Column(db.String(255), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    dispatched_at = db.Column(db.DateTime, nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    # Celery task id prefix of outbox messages, followed by the message id
+    TASK_ID_PREFIX = 'outbox-'
+
+    def __init__(self, task, args=None, kwargs=None):
+        """
+        Constructor function for OutboxMessage model.
+
+        :param task: Celery task name
+        :param args: Task arguments
+        :param kwargs: Task keyword arguments
+        """
+        self.task = task
+        self.payload = json.dumps({
+            'args': list(args or ()),
+            'kwargs': kwargs or {}
+        })
+
+    def __repr__(self):
+        """
+        Human readable class name representation.
+        :return: Model name with task name
+        """
+        return '<OutboxMessage %r>' % self.task
+
+    @staticmethod
+    def to_message(message_id, task, payload):
+        """
+        Build a task message from outbox columns.
+
+        :param message_id: Outbox message ID
+        :param task: Celery task name
+        :param payload: JSON encoded arguments
+        :return: Task message dictionary
+        """
+        payload = json.loads(payload)
+
+        return {
+            'id': message_id,
+            'task': task,
+            'args': payload['args'],
+            'kwargs': payload['kwargs']
+        }
+
+    @staticmethod
+    def message_id(task_id):
+        """
+        Outbox message ID of a Celery task id.
+
+        :param task_id: Celery task id
+        :return: Message ID, None for tasks not sent through the outbox
+        """
+        if not task_id or not task_id.startswith(OutboxMessage.TASK_ID_PREFIX):
+            return None
+
+        try:
+            return int(task_id[len(OutboxMessage.TASK_ID_PREFIX):])
+        except ValueError:
+            return None
+
+    @staticmethod
+    def claim(message_id):
+        """
+        Claim a message for processing. Only the first delivery of a message
+        published more than once gets the claim.
+
+        :param message_id: Outbox message ID
+        :return: Boolean, False if the message was already processed
+        """
+        table = OutboxMessage.__table__
+
+        claimed = db.session.execute(
+            table.update()
+            .where(table.c.id == message_id)
+            .where(table.c.processed_at.is_(None))
+            .values(processed_at=datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+
+        return claimed > 0
+
+    @staticmethod
+    def release(message_id):
+        """
+        Release the claim of a message whose task failed, so its retry runs.
+
+        :param message_id: Outbox message ID
+        """
+        table = OutboxMessage.__table__
+
+        db.session.rollback()
+        db.session.execute(
+            table.update()
+            .where(table.c.id == message_id)
+            .values(processed_at=None)
+        )
+        db.session.commit()
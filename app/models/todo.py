@@ -5,6 +5,26 @@ from . import ModelMixin
 
 class Todo(db.Model, ModelMixin):
     __tablename__ = 'todos'
+    __table_args__ = (
+        db.Index('ix_todos_owner_id_date_modified_id', 'owner_id', 'date_modified', 'id'),
+        db.Index('ix_todos_owner_id_completed_due_date', 'owner_id', 'completed', 'due_date'),
+        db.Index('ix_todos_card_id_completed_due_date', 'card_id', 'completed', 'due_date'),
+        # Keyset pages of the todo lists, see keyset_paginate
+        db.Index('ix_todos_owner_id_date_created_id', 'owner_id', 'date_created', 'id'),
+        db.Index('ix_todos_card_id_date_created_id', 'card_id', 'date_created', 'id'),
+        # Open todos by due date, serves the delayed list and reminders
+        db.Index('ix_todos_owner_id_due_date_open', 'owner_id', 'due_date',
+                 postgresql_where=db.text('NOT completed'),
+                 sqlite_where=db.text('completed = 0')),
+        # Open todos waiting for a reminder, scanned by due date
+        db.Index('ix_todos_due_date_id_unnotified', 'due_date', 'id',
+                 postgresql_where=db.text('NOT completed AND NOT notified'),
+                 sqlite_where=db.text('completed = 0 AND notified = 0')),
+        # Open todos by due date alone, finds todos that just became delayed
+        db.Index('ix_todos_due_date_open', 'due_date', 'card_id', 'owner_id',
+                 postgresql_where=db.text('NOT completed'),
+                 sqlite_where=db.text('completed = 0')),
+    )
 
     # Todo table fields
     title = db.Column(db.String(255), nullable=False)
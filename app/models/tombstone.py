@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from app.extensions import db
+
+from . import ModelMixin
+
+
+class Tombstone(db.Model, ModelMixin):
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        db.Index('ix_tombstones_owner_id_date_modified_id', 'owner_id', 'date_modified', 'id'),
+        db.Index('ix_tombstones_date_modified', 'date_modified'),
+    )
+
+    # Tombstone table fields
+    record_type = db.Column(db.String(20), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+
+    def __init__(self, owner_id, record_type, record_id):
+        """
+        Constructor function for Tombstone model.
+
+        :param owner_id: Deleted record owner id
+        :param record_type: Deleted record type, e.g. 'card' or 'todo'
+        :param record_id: Deleted record id
+        """
+        self.owner_id = owner_id
+        self.record_type = record_type
+        self.record_id = record_id
+
+    def __repr__(self):
+        """
+        Human readable class name representation.
+        :return: Model name with deleted record
+        """
+        return '<Tombstone %s %r>' % (self.record_type, self.record_id)
+
+    @staticmethod
+    def bury(record_type, model, *criteria):
+        """
+        Record deletion of every matching row with a single INSERT ... SELECT.
+
+        :param record_type: Deleted records type
+        :param model: Deleted records model
+        :param criteria: Filter criteria selecting deleted rows
+        :return: Number of tombstones
+        """
+        now = datetime.utcnow()
+        table = model.__table__
+
+        rows = db.select([
+            db.literal(record_type),
+            table.c.id,
+            table.c.owner_id,
+            db.literal(now),
+            db.literal(now)
+        ]).where(db.and_(*criteria))
+
+        result = db.session.execute(
+            Tombstone.__table__.insert().from_select(
+                ['record_type', 'record_id', 'owner_id', 'date_created', 'date_modified'],
+                rows
+            )
+        )
+
+        return result.rowcount
+
+    @staticmethod
+    def purge(before):
+        """
+        Delete tombstones no sync watermark can reach any more.
+
+        :param before: Oldest valid watermark
+        :return: Number of deleted tombstones
+        """
+        table = Tombstone.__table__
+
+        return db.session.execute(
+            table.delete().where(table.c.date_modified < before)
+        ).rowcount
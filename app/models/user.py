@@ -1,7 +1,10 @@
 import datetime
 
 from app.extensions import db
+from sqlalchemy import event, inspect
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.utils import generate_secret_key, encode_jwt
 from . import ModelMixin
@@ -10,7 +13,12 @@ from .todo import Todo
 
 from flask_login import UserMixin
 
-from app.extensions import bcrypt
+from app.extensions import hasher, token_cache
+
+
+# User columns kept with cached access tokens
+CACHED_COLUMNS = ('id', 'date_created', 'date_modified', 'first_name', 'last_name',
+                  'email', 'active')
 
 
 class User(db.Model, ModelMixin, UserMixin):
@@ -27,9 +35,18 @@ class User(db.Model, ModelMixin, UserMixin):
     confirmed_at = db.Column(db.DateTime, nullable=True)
     active = db.Column(db.Boolean(), default=False)
 
-    # Relationships
-    cards = db.relationship('Card', cascade='all, delete-orphan', backref='owner', lazy='dynamic')
-    todos = db.relationship('Todo', cascade='all, delete-orphan', backref='owner', lazy='dynamic')
+    # Todo counters, see TodoCounters
+    todos_total = db.Column(db.Integer, default=0, nullable=False)
+    todos_completed = db.Column(db.Integer, default=0, nullable=False)
+    todos_delayed = db.Column(db.Integer, default=0, nullable=False)
+
+    # Relationships, eager loading is chosen per endpoint with query options
+    cards = db.relationship('Card', cascade='all, delete-orphan', backref='owner')
+    todos = db.relationship('Todo', cascade='all, delete-orphan', backref='owner')
+
+    # Query counterparts of the relationships, for filtered sub-queries
+    cards_query = db.relationship('Card', lazy='dynamic', viewonly=True)
+    todos_query = db.relationship('Todo', lazy='dynamic', viewonly=True)
 
     def __init__(self, first_name, last_name, email, password, active=False):
         """
@@ -41,7 +58,7 @@ class User(db.Model, ModelMixin, UserMixin):
         :param password: User password
         """
         self.first_name = first_name
-        self.last_name = last_name,
+        self.last_name = last_name
         self.email = email
         self.password = password
         self.active = active
@@ -69,9 +86,10 @@ class User(db.Model, ModelMixin, UserMixin):
         """
 
         # Generate password hash
-        self._password = bcrypt.generate_password_hash(value)
+        self._password = hasher.hash(value)
 
-        # Generate secret key on password change
+        # Generate secret key on password change, cached access tokens are
+        # dropped on commit by invalidate_cached_tokens
         self.secret_key = generate_secret_key()
 
     @hybrid_property
@@ -167,11 +185,51 @@ class User(db.Model, ModelMixin, UserMixin):
         :return: Boolean
         """
 
-        if bcrypt.check_password_hash(self.password, password):
+        if hasher.verify(self.password, password):
+            return True
+
+        return False
+
+    def rehash_password(self, password):
+        """
+        Upgrade password hash to the configured cost, keeping the secret key.
+
+        :param password: Verified raw password
+        :return: Boolean
+        """
+
+        if hasher.needs_rehash(self.password):
+            self._password = hasher.hash(password)
             return True
 
         return False
 
+    def cache_state(self):
+        """
+        Snapshot of the user columns request handling reads, for the token
+        cache. Credentials are never cached, other columns load on access.
+
+        :return: Dictionary of column values
+        """
+        return {key: getattr(self, key) for key in CACHED_COLUMNS}
+
+    @staticmethod
+    def from_cache_state(state):
+        """
+        Attach a cached user to the current session without a query.
+
+        :param state: Dictionary of column values
+        :return: User
+        """
+        user = inspect(User).class_manager.new_instance()
+
+        for key, value in state.items():
+            set_committed_value(user, key, value)
+
+        make_transient_to_detached(user)
+
+        return db.session.merge(user, load=False)
+
     def generate_token(self):
         # Create payload for token
         """
@@ -185,3 +243,12 @@ class User(db.Model, ModelMixin, UserMixin):
         }
 
         return encode_jwt(payload)
+
+
+@event.listens_for(User, 'after_update')
+def invalidate_cached_tokens(mapper, connection, target):
+    """
+    Drop cached access tokens whenever user data changes, e.g. `active`,
+    once the change is committed.
+    """
+    token_cache.invalidate_user_on_commit(inspect(target).session, target.id)
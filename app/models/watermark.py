@@ -0,0 +1,56 @@
+from app.extensions import db
+
+from . import ModelMixin
+
+
+class Watermark(db.Model, ModelMixin):
+    __tablename__ = 'watermarks'
+
+    # Watermark table fields
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    value = db.Column(db.DateTime, nullable=False)
+
+    def __init__(self, name, value):
+        """
+        Constructor function for Watermark model.
+
+        :param name: Watermark name, e.g. the task keeping it
+        :param value: Time processed up to
+        """
+        self.name = name
+        self.value = value
+
+    def __repr__(self):
+        """
+        Human readable class name representation.
+        :return: Model name with watermark name
+        """
+        return '<Watermark %r>' % self.name
+
+    @staticmethod
+    def get(name):
+        """
+        Lock and read a watermark, concurrent readers wait for the holder
+        to commit on PostgreSQL.
+
+        :param name: Watermark name
+        :return: Time processed up to, None if never set
+        """
+        watermark = Watermark.query.filter_by(name=name).with_for_update().first()
+
+        return watermark.value if watermark else None
+
+    @staticmethod
+    def set(name, value):
+        """
+        Store a watermark, committed with the current transaction.
+
+        :param name: Watermark name
+        :param value: Time processed up to
+        """
+        watermark = Watermark.query.filter_by(name=name).first()
+
+        if watermark is None:
+            Watermark(name, value).save()
+        else:
+            watermark.value = value
@@ -2,6 +2,7 @@ from app.extensions import ma
 
 from app.models.card import Card
 
+from .compiled_schemas import CompiledSchema
 from .todo_schemas import TodoSchema
 
 
@@ -9,14 +10,25 @@ class CardSchema(ma.ModelSchema):
     class Meta:
         model = Card
         fields = ('id', 'date_created', 'date_modified', 'title',
-                  'note', 'parent_card_id', 'owner_id', 'child_cards', 'todos')
+                  'note', 'parent_card_id', 'owner_id', 'child_cards', 'todos',
+                  'todos_total', 'todos_completed', 'todos_delayed')
 
 
 class CardFeedsSchema(ma.ModelSchema):
     class Meta:
         model = Card
         fields = ('id', 'date_created', 'date_modified', 'title',
-                  'note', 'parent_card_id', 'owner_id', 'child_cards', 'todos')
+                  'note', 'parent_card_id', 'owner_id', 'child_cards', 'todos',
+                  'todos_total', 'todos_completed', 'todos_delayed')
 
     child_cards = ma.Nested('self', many=True)
     todos = ma.Nested(TodoSchema, many=True)
+
+
+# Compiled serializers
+card_serializer = CompiledSchema(CardSchema)
+card_row_serializer = CompiledSchema(CardFeedsSchema, exclude=('child_cards', 'todos'))
+
+# Counter writes keep date_modified, sync leaves the counters out
+card_sync_serializer = CompiledSchema(CardFeedsSchema, exclude=(
+    'child_cards', 'todos', 'todos_total', 'todos_completed', 'todos_delayed'))
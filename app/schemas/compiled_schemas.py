@@ -0,0 +1,196 @@
+from datetime import timezone
+
+from marshmallow import fields
+from marshmallow.utils import ensure_text_type
+from marshmallow_sqlalchemy.fields import Related
+
+
+class CompileError(Exception):
+    """
+    Raised when a schema uses features the compiler does not support.
+    """
+    pass
+
+
+def _integer(value):
+    return None if value is None else int(value)
+
+
+def _string(value):
+    return None if value is None else ensure_text_type(value)
+
+
+def _datetime(value):
+    # Same output as marshmallow.utils.isoformat, without pytz
+    if value is None:
+        return None
+
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc).isoformat()
+
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def _related_ids(value):
+    return None if value is None else [item.id for item in value]
+
+
+class CompiledSchema(object):
+    """
+    Dump objects through a function generated once from a marshmallow schema.
+
+    The generated function reads every field straight from the object and
+    formats it the same way marshmallow does, skipping the per object field
+    machinery. Schemas with fields or hooks the compiler does not know fall
+    back to a regular marshmallow dump.
+    """
+
+    def __init__(self, schema_cls, **kwargs):
+        """
+        Constructor function for CompiledSchema.
+
+        :param schema_cls: Marshmallow schema class
+        :param kwargs: Schema options, e.g. only or exclude
+        """
+        self.schema_cls = schema_cls
+        self.kwargs = kwargs
+
+        self._serialize = None
+        self.compiled = None
+
+    @property
+    def serialize(self):
+        """
+        Compile the schema on first use.
+
+        :return: Function turning an object into a dictionary
+        """
+        if self._serialize is None:
+            schema = self.schema_cls(**self.kwargs)
+
+            try:
+                self._serialize = _compile(schema, {})
+                self.compiled = True
+            except CompileError:
+                self._serialize = lambda obj: schema.dump(obj).data
+                self.compiled = False
+
+        return self._serialize
+
+    def dump(self, obj):
+        """
+        Serialize a single object.
+
+        :param obj: Object to serialize
+        :return: Dictionary
+        """
+        return self.serialize(obj)
+
+    def dump_many(self, objs):
+        """
+        Serialize a list of objects.
+
+        :param objs: Objects to serialize
+        :return: List of dictionaries
+        """
+        serialize = self.serialize
+        return [serialize(obj) for obj in objs]
+
+
+def _compile(schema, cache):
+    """
+    Generate the serializer function of a schema instance.
+
+    :param schema: Marshmallow schema instance
+    :param cache: Functions compiled so far, used for recursive schemas
+    :return: Serializer function
+    """
+
+    for (tag, pass_many), processors in schema.__processors__.items():
+        if processors and tag in ('pre_dump', 'post_dump'):
+            raise CompileError('Dump processors are not supported.')
+
+    key = (type(schema), tuple(sorted(schema.only or ())),
+           tuple(sorted(schema.exclude or ())))
+    if key in cache:
+        return cache[key]
+
+    # Placeholder resolved once compilation is done, lets nested fields
+    # refer to the schema being compiled
+    holder = []
+    cache[key] = lambda obj: holder[0](obj)
+
+    namespace = {}
+    items = []
+
+    for index, (name, field) in enumerate(sorted(schema.fields.items())):
+        if field.load_only:
+            continue
+
+        attribute = field.attribute or name
+        if '.' in attribute or not attribute.isidentifier():
+            raise CompileError('Unsupported attribute {0!r}.'.format(attribute))
+
+        value = 'obj.' + attribute
+        field_type = type(field)
+
+        if field_type is fields.Field:
+            expression = value
+
+        elif field_type is fields.Integer and not field.as_string:
+            expression = '_integer({0})'.format(value)
+
+        elif field_type is fields.String:
+            expression = '_string({0})'.format(value)
+
+        elif field_type is fields.Boolean:
+            # Keep marshmallow truthy and falsy rules
+            helper = '_field_{0}'.format(index)
+            namespace[helper] = field._serialize
+            expression = '{0}({1}, None, obj)'.format(helper, value)
+
+        elif field_type is fields.DateTime:
+            if field.dateformat not in (None, 'iso', 'iso8601') or field.localtime:
+                raise CompileError('Unsupported date format.')
+            expression = '_datetime({0})'.format(value)
+
+        elif isinstance(field, fields.List) and type(field.container) is Related:
+            if len(field.container.related_keys) != 1 or \
+                    field.container.related_keys[0].key != 'id':
+                raise CompileError('Unsupported related keys.')
+            expression = '_related_ids({0})'.format(value)
+
+        elif field_type is fields.Nested:
+            if isinstance(field.only, str):
+                raise CompileError('Plucked nested fields are not supported.')
+
+            helper = '_nested_{0}'.format(index)
+            namespace[helper] = _compile(field.schema, cache)
+
+            if field.many:
+                expression = '[{0}(item) for item in {1}]'.format(helper, value)
+            else:
+                expression = '{0}({1})'.format(helper, value)
+
+            expression = 'None if {0} is None else {1}'.format(value, expression)
+
+        else:
+            raise CompileError('Unsupported field {0}.'.format(field_type.__name__))
+
+        items.append('        {0!r}: {1},'.format(field.dump_to or name, expression))
+
+    source = 'def serialize(obj):\n    return {\n' + '\n'.join(items) + '\n    }\n'
+
+    namespace.update({
+        '_integer': _integer,
+        '_string': _string,
+        '_datetime': _datetime,
+        '_related_ids': _related_ids
+    })
+    exec(compile(source, '<compiled {0}>'.format(type(schema).__name__), 'exec'),
+         namespace)
+
+    holder.append(namespace['serialize'])
+    cache[key] = namespace['serialize']
+
+    return namespace['serialize']
@@ -2,9 +2,15 @@ from app.extensions import ma
 
 from app.models.todo import Todo
 
+from .compiled_schemas import CompiledSchema
+
 
 class TodoSchema(ma.ModelSchema):
     class Meta:
         model = Todo
         fields = ('id', 'date_created', 'date_modified', 'title', 'note',
                   'due_date', 'completed_at', 'card_id', 'owner_id', 'completed')
+
+
+# Compiled serializers
+todo_serializer = CompiledSchema(TodoSchema)
@@ -2,9 +2,15 @@ from app.extensions import ma
 
 from app.models.user import User
 
+from .compiled_schemas import CompiledSchema
+
 
 class UserSchema(ma.ModelSchema):
     class Meta:
         model = User
         fields = ('id', 'date_created', 'date_modified', 'first_name',
                   'last_name', 'email')
+
+
+# Compiled serializers
+user_serializer = CompiledSchema(UserSchema)
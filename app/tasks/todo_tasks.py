@@ -0,0 +1,190 @@
+import json
+import logging
+import time
+
+from datetime import datetime, timedelta
+
+from flask import current_app, render_template
+
+from app.celery_worker import celery
+
+from app.extensions import db, dispatcher, todo_counters
+from app.models.tombstone import Tombstone
+from app.models.user import User
+from app.models.watermark import Watermark
+from app.utils.digest_utils import digest_window, iter_digests
+from app.utils.email_utils import send_email_batch
+from app.utils.sync_utils import get_retention_cutoff
+from app.utils.todo_utils import claim_due_todos
+
+logger = logging.getLogger(__name__)
+
+
+def reminder_messages(rows):
+    """
+    Build one reminder email per owner.
+
+    :param rows: Claimed todo rows
+    :return: List of send_email keyword argument dictionaries
+    """
+    todos = {}
+    for row in rows:
+        todos.setdefault(row.owner_id, []).append(row)
+
+    owners = db.session.query(User.id, User.email, User.first_name) \
+        .filter(User.id.in_(todos))
+
+    return [{
+        'subject': 'RDoList Reminder.',
+        'recipients': [email],
+        'text_body': render_template('emails/texts/reminder_email.txt',
+                                     first_name=first_name, todos=todos[owner_id]),
+        'html_body': render_template('emails/reminder_email.html',
+                                     first_name=first_name, todos=todos[owner_id])
+    } for owner_id, email, first_name in owners]
+
+
+@celery.task()
+def send_due_reminders():
+    """
+    Remind owners of todos due within REMINDER_LEAD seconds.
+
+    Todos are claimed in keyset batches, each batch commits together with
+    its reminder emails in the outbox. Todos overdue by more than
+    REMINDER_MAX_LAG seconds are skipped.
+
+    :return: Scan statistics
+    """
+    config = current_app.config
+    started = time.perf_counter()
+    now = datetime.now()
+    due = now + timedelta(seconds=config['REMINDER_LEAD'])
+
+    stats = {'todos': 0, 'emails': 0, 'batches': 0, 'contended': 0, 'lag_max': 0.0,
+             'lag_avg': 0.0}
+    lag_total = 0.0
+    after = None
+
+    while time.perf_counter() - started < config['REMINDER_SCAN_SECONDS']:
+        rows = claim_due_todos(now - timedelta(seconds=config['REMINDER_MAX_LAG']), due,
+                               after, config['REMINDER_BATCH_SIZE'])
+
+        # Other scanners claimed part of the batch, try again within the budget
+        if rows is None:
+            stats['contended'] += 1
+            continue
+
+        if not rows:
+            break
+
+        messages = reminder_messages(rows)
+        dispatcher.enqueue(send_email_batch, messages)
+        db.session.commit()
+
+        after = (rows[-1].due_date, rows[-1].id)
+
+        # Lag is how long after the reminder became due it was claimed
+        for row in rows:
+            lag = max(0.0, (now - row.due_date).total_seconds() + config['REMINDER_LEAD'])
+            lag_total += lag
+            stats['lag_max'] = max(stats['lag_max'], lag)
+
+        stats['todos'] += len(rows)
+        stats['emails'] += len(messages)
+        stats['batches'] += 1
+
+    elapsed = time.perf_counter() - started
+
+    stats.update({
+        'seconds': round(elapsed, 3),
+        'todos_per_sec': round(stats['todos'] / elapsed, 1) if elapsed else 0.0,
+        'lag_max': round(stats['lag_max'], 1),
+        'lag_avg': round(lag_total / stats['todos'], 1) if stats['todos'] else 0.0
+    })
+
+    logger.info('reminders %s', json.dumps(stats))
+
+    return stats
+
+
+@celery.task()
+def send_daily_digests():
+    """
+    Send every active user a digest of overdue todos, todos due today and
+    todos completed yesterday, grouped by card.
+
+    Owners are processed in batches of DIGEST_BATCH_SIZE, the rendered
+    emails of a batch go to the outbox in chunks of DIGEST_CHUNK_SIZE.
+
+    :return: Run statistics
+    """
+    config = current_app.config
+    started = time.perf_counter()
+    window = digest_window()
+
+    # Look templates up once
+    text_template = current_app.jinja_env.get_template('emails/texts/digest_email.txt')
+    html_template = current_app.jinja_env.get_template('emails/digest_email.html')
+
+    stats = {'emails': 0, 'batches': 0}
+
+    for digests in iter_digests(window, config['DIGEST_BATCH_SIZE'], config['DIGEST_MAX_ITEMS']):
+        messages = [{
+            'subject': 'RDoList Daily Digest.',
+            'recipients': [user.email],
+            'text_body': text_template.render(first_name=user.first_name, digest=digest),
+            'html_body': html_template.render(first_name=user.first_name, digest=digest)
+        } for user, digest in digests]
+
+        chunk_size = config['DIGEST_CHUNK_SIZE']
+        for index in range(0, len(messages), chunk_size):
+            dispatcher.enqueue(send_email_batch, messages[index:index + chunk_size])
+        db.session.commit()
+
+        stats['emails'] += len(messages)
+        stats['batches'] += 1
+
+    elapsed = time.perf_counter() - started
+
+    stats.update({
+        'seconds': round(elapsed, 3),
+        'emails_per_sec': round(stats['emails'] / elapsed, 1) if elapsed else 0.0
+    })
+
+    logger.info('digests %s', json.dumps(stats))
+
+    return stats
+
+
+@celery.task()
+def refresh_delayed_counters():
+    """
+    Recount delayed todo counters of cards and users whose todos became
+    overdue since the last run, however long ago it was. The first run
+    looks back COUNTER_REFRESH_WINDOW seconds.
+
+    :return: Number of updated rows
+    """
+    now = datetime.now()
+    since = Watermark.get('delayed_counters') or \
+        now - timedelta(seconds=current_app.config['COUNTER_REFRESH_WINDOW'])
+
+    updated = todo_counters.refresh_delayed(since, now)
+    Watermark.set('delayed_counters', now)
+    db.session.commit()
+
+    return updated
+
+
+@celery.task()
+def purge_tombstones():
+    """
+    Delete tombstones older than SYNC_RETENTION_DAYS, sync rejects
+    watermarks that old.
+
+    :return: Number of deleted tombstones
+    """
+    deleted = Tombstone.purge(get_retention_cutoff())
+    db.session.commit()
+
+    return deleted
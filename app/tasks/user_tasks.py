@@ -2,23 +2,26 @@ from flask import render_template
 
 from app.celery_worker import celery
 
-from app.utils.email_utils import send_email
+from app.utils.email_utils import retry_countdown, send_email
 
 
-@celery.task()
-def send_welcome_email(email):
+@celery.task(bind=True, max_retries=5)
+def send_welcome_email(self, email):
     """
     Send welcome email.
 
     :param email: Recipient email
     """
-    send_email('Welcome To RDoList.', [email],
-               render_template('emails/texts/welcome_email.txt'),
-               render_template('emails/welcome_email.html'))
+    try:
+        send_email('Welcome To RDoList.', [email],
+                   render_template('emails/texts/welcome_email.txt'),
+                   render_template('emails/welcome_email.html'))
+    except Exception as e:
+        raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
 
 
-@celery.task()
-def send_verification_code_email(email, code):
+@celery.task(bind=True, max_retries=5)
+def send_verification_code_email(self, email, code):
     """
     Send verification code.
 
@@ -26,8 +29,11 @@ def send_verification_code_email(email, code):
     :param code: Secret code
     """
 
-    send_email('RDoList Verification Code.', [email],
-               render_template('emails/texts/verification_code_email.txt',
-                               code=code),
-               render_template('emails/verification_code_email.html',
-                               code=code))
+    try:
+        send_email('RDoList Verification Code.', [email],
+                   render_template('emails/texts/verification_code_email.txt',
+                                   code=code),
+                   render_template('emails/verification_code_email.html',
+                                   code=code))
+    except Exception as e:
+        raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
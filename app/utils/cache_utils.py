@@ -0,0 +1,175 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class TokenCache(object):
+    """
+    Bounded LRU cache of resolved access tokens with a time to live.
+
+    The cache lives in process memory, so entries invalidated in one process
+    stay valid in others until their TTL expires. Users changed inside a
+    transaction are invalidated once it commits, and values read before an
+    invalidation are never cached after it.
+    """
+
+    def __init__(self, app=None):
+        """
+        Constructor function for TokenCache.
+
+        :param app: Flask app
+        """
+        self.max_size = 1024
+        self.ttl = 300
+
+        self._entries = OrderedDict()
+        self._user_tokens = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Read cache settings from app config.
+
+        :param app: Flask app
+        """
+        self.max_size = app.config.get('TOKEN_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('TOKEN_CACHE_TTL', self.ttl)
+
+        if not event.contains(Session, 'after_commit', self._after_commit):
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_transaction_end', self._after_transaction_end)
+
+    def get(self, token):
+        """
+        Get cached value of a token.
+
+        :param token: Access token
+        :return: Cached value or None
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, user_id, value = entry
+
+            if expires_at < time.time():
+                self._remove(token)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token)
+            self.hits += 1
+
+            return value
+
+    def set(self, token, user_id, value, generation=None):
+        """
+        Cache value of a token.
+
+        :param token: Access token
+        :param user_id: Token owner ID
+        :param value: Value to cache
+        :param generation: Cache generation read before the value was
+            loaded, the value is dropped if users were invalidated since
+        """
+        if not self.max_size:
+            return
+
+        with self._lock:
+            if generation is not None and not generation == self.generation:
+                return
+
+            if token in self._entries:
+                self._remove(token)
+
+            self._entries[token] = (time.time() + self.ttl, user_id, value)
+            self._user_tokens.setdefault(user_id, set()).add(token)
+
+            # Drop least recently used entries
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        """
+        Drop every cached token of an user.
+
+        :param user_id: User ID
+        """
+        with self._lock:
+            self.generation += 1
+
+            for token in self._user_tokens.pop(user_id, ()):
+                self._entries.pop(token, None)
+
+    def invalidate_user_on_commit(self, session, user_id):
+        """
+        Drop every cached token of an user once the current transaction
+        commits, so concurrent requests can not cache the old row again.
+
+        :param session: Database session
+        :param user_id: User ID
+        """
+        session.info.setdefault('invalidated_users', set()).add(user_id)
+
+    def clear(self):
+        """
+        Drop all cached tokens.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._user_tokens.clear()
+
+    def stats(self):
+        """
+        Cache usage counters.
+
+        :return: Dictionary of counters
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _after_commit(self, session):
+        for user_id in session.info.pop('invalidated_users', ()):
+            self.invalidate_user(user_id)
+
+    def _after_transaction_end(self, session, transaction):
+        # Rolled back changes leave cached tokens valid
+        if transaction.parent is None:
+            session.info.pop('invalidated_users', None)
+
+    def _remove(self, token):
+        """
+        Remove a token entry, lock must be held by the caller.
+
+        :param token: Access token
+        """
+        expires_at, user_id, value = self._entries.pop(token)
+
+        tokens = self._user_tokens.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+
+            if not tokens:
+                del self._user_tokens[user_id]
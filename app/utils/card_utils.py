@@ -1,75 +1,56 @@
 from datetime import datetime
 
-from functools import wraps
+from webargs import fields, validate
 
-from webargs import fields, validate, ValidationError
+from flask import request
 
 from flask_login import current_user
 
-from .views_utils import json_response_with_error
+from sqlalchemy import or_
 
+from .counter_utils import COUNTERS
+from .etag_utils import get_scope_stats
+from .resource_utils import load_resource, validate_reference
+
+from app.extensions import db, todo_counters
 from app.models.card import Card
 from app.models.todo import Todo
+from app.models.user import User
+from app.schemas.card_schemas import card_row_serializer
+from app.schemas.todo_schemas import todo_serializer
 
 
 # Utilities
-def validate_card_id(f):
-    """
-    Validate card id decorator.
-    :param f:
-    :return:
-    """
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        card = Card.query.get(kwargs['card_id'])
-
-        # Check existent and ownership
-        error = None
-        if card:
-            if not card.owner_id == current_user.id:
-                error = ['You do not have access to use this card.']
-        else:
-            error = ['Invalid card id.']
-
-        # Through error response
-        if error:
-            return json_response_with_error(
-                code=422,
-                errors={
-                    'card_id': error
-                },
-                message='Card ID is invalid or access denied.'
-            )
-
-        return f(*args, **kwargs)
-
-    return decorated_function
+card_id_errors = {
+    'missing': 'Invalid card id.',
+    'denied': 'You do not have access to use this card.',
+    'message': 'Card ID is invalid or access denied.'
+}
 
 
-# Request validators
-def validate_card_existent(id):
+def load_card(*options):
     """
-    Check card existent.
-    :param id: Parent card ID
+    Load the route card of the current user and pass it to the view as
+    `card`, see load_resource.
+    :param options: Query options of the endpoint
+    :return: Route function decorator
     """
-    card = Card.query.get(id)
+    return load_resource(Card, 'card_id', 'card', card_id_errors, options)
 
-    if not card:
-        raise \
-            ValidationError('Invalid parent card id.')
 
+# Card serializer relations: child card ids joined into the card query,
+# todo ids with one extra query
+card_detail_options = (
+    db.joinedload(Card.child_cards).load_only('id'),
+    db.selectinload(Card.todos).load_only('id')
+)
 
-def validate_ownership(id):
-    """
-    Check if user has access to the parent card.
-    :param id: Parent card ID
-    """
-    card = Card.query.get(id)
 
-    if card:
-        if not card.owner_id == current_user.id:
-            raise \
-                ValidationError('You do not have access to use this card.')
+# Request validators
+validate_card_reference = validate_reference(Card, {
+    'missing': 'Invalid parent card id.',
+    'denied': 'You do not have access to use this card.'
+})
 
 
 def get_todo_list(card_id, state='all'):
@@ -77,35 +58,169 @@ def get_todo_list(card_id, state='all'):
     Get todo list.
     :param card_id: Card ID
     :param state: Todo sate
-    :return Todo lists
+    :return Todo list query
     """
 
     if state == 'completed':
         todos = Todo.query.filter_by(owner_id=current_user.id, card_id=card_id,
-                                     completed=True).all()
+                                     completed=True)
 
     elif state == 'incomplete':
         todos = Todo.query.filter_by(owner_id=current_user.id, card_id=card_id,
-                                     completed=False).all()
+                                     completed=False)
 
     elif state == 'delayed':
-        todos = Todo.query.filter(Todo.owner_id == current_user.id,
-                                  Todo.card_id == card_id, Todo.completed < 1,
-                                  Todo.due_date < datetime.now()).all()
+        todos = Todo.query.filter_by(owner_id=current_user.id, card_id=card_id,
+                                     completed=False) \
+            .filter(Todo.due_date < datetime.now())
 
     else:
-        todos = Todo.query.filter_by(owner_id=current_user.id, card_id=card_id).all()
+        todos = Todo.query.filter_by(owner_id=current_user.id, card_id=card_id)
 
     return todos
 
 
+def get_card_feeds(owner_id, card_id=None):
+    """
+    Build card feeds from a single pass over owner cards and todos.
+
+    All cards and card todos of the owner are fetched with one query per
+    table and the tree is assembled in memory, so the number of queries
+    does not depend on the depth or width of the card tree.
+
+    :param owner_id: Cards owner ID
+    :param card_id: Root card ID, top level cards are used if omitted
+    :return: Serialized card feed or list of card feeds
+    """
+
+    # Fetch all owner cards and todos
+    cards = Card.query.filter_by(owner_id=owner_id).order_by(Card.id).all()
+    todos = Todo.query.join(Card, Todo.card_id == Card.id) \
+        .filter(Card.owner_id == owner_id).order_by(Todo.id).all()
+
+    feeds = {}
+    children = {}
+    # Serialize flat rows without walking relationships
+    for card, data in zip(cards, card_row_serializer.dump_many(cards)):
+        data['child_cards'] = children.setdefault(card.id, [])
+        data['todos'] = []
+        feeds[card.id] = data
+
+    # Attach child cards to their parents
+    for card in cards:
+        children.setdefault(card.parent_card_id, []).append(feeds[card.id])
+
+    # Attach todos to their cards
+    for todo, data in zip(todos, todo_serializer.dump_many(todos)):
+        feeds[todo.card_id]['todos'].append(data)
+
+    if card_id is not None:
+        return feeds[card_id]
+
+    return children.get(None, [])
+
+
+def get_card_summary(owner_id):
+    """
+    Todo counters of the owner and of every owner card, with subtree
+    roll-ups, read from the stored counters only.
+
+    :param owner_id: Cards owner ID
+    :return: Summary dictionary
+    """
+
+    user = db.session.query(User.todos_total, User.todos_completed, User.todos_delayed) \
+        .filter(User.id == owner_id).one()
+    cards = db.session.query(Card.id, Card.parent_card_id, Card.path, Card.todos_total,
+                             Card.todos_completed, Card.todos_delayed) \
+        .filter(Card.owner_id == owner_id).order_by(Card.id).all()
+
+    subtrees = todo_counters.rollup(cards)
+
+    return {
+        'todos_total': user.todos_total,
+        'todos_completed': user.todos_completed,
+        'todos_delayed': user.todos_delayed,
+        'cards': [{
+            'id': card.id,
+            'parent_card_id': card.parent_card_id,
+            'todos_total': card.todos_total,
+            'todos_completed': card.todos_completed,
+            'todos_delayed': card.todos_delayed,
+            'subtree': subtrees[card.id]
+        } for card in cards]
+    }
+
+
+def get_card_summary_etag_parts():
+    """
+    ETag parts of the card summary. Counter writes keep date_modified, so
+    the counters and the todos they count are part of the ETag.
+    :return: List of ETag parts
+    """
+    return get_scope_stats(
+        (Card, [Card.owner_id == current_user.id], COUNTERS),
+        (User, [User.id == current_user.id], COUNTERS),
+        (Todo, [Todo.owner_id == current_user.id])
+    )
+
+
+def get_card_etag_parts(card_id, card):
+    """
+    ETag parts of a single card with its child card and todo IDs.
+    :param card_id: Card ID
+    :param card: Card
+    :return: List of ETag parts
+    """
+    return get_scope_stats(
+        (Card, [or_(Card.id == card_id, Card.parent_card_id == card_id)], COUNTERS),
+        (Todo, [Todo.card_id == card_id])
+    )
+
+
+def get_card_todos_etag_parts(card_id, card):
+    """
+    ETag parts of a card todo list.
+    :param card_id: Card ID
+    :param card: Card
+    :return: List of ETag parts
+    """
+    state = request.args.get(key='state', default='all', type=str)
+
+    return get_scope_stats(
+        (Todo, [get_todo_list(card_id, state).whereclause])
+    )
+
+
+def get_card_feeds_etag_parts(card_id=None, card=None):
+    """
+    ETag parts of card feeds, the whole owner tree or a single card subtree.
+    :param card_id: Root card ID
+    :param card: Root card
+    :return: List of ETag parts
+    """
+
+    # Cards created before paths existed fall back to the whole owner tree
+    if card is None or card.path is None:
+        cards = [Card.owner_id == current_user.id]
+    else:
+        cards = [Card.path_startswith(card.path)]
+
+    card_ids = Card.query.with_entities(Card.id).filter(*cards)
+
+    return get_scope_stats(
+        (Card, cards, COUNTERS),
+        (Todo, [Todo.card_id.in_(card_ids)])
+    )
+
+
 # Reusable args
 card_title_arg = fields.String(validate=[validate.Length(max=255)],
                                required=True)
 
 card_note_arg = fields.String(missing=None, required=False)
 
-parent_card_id_arg = fields.Integer(validate=[validate_card_existent, validate_ownership])
+parent_card_id_arg = fields.Integer(validate=validate_card_reference)
 
 # Create card args
 create_card_args = {
@@ -122,6 +237,6 @@ update_card_args = {
 
 # Update parent card args
 update_parent_card_args = {
-    'parent_card_id': fields.Integer(validate=[validate_card_existent, validate_ownership],
+    'parent_card_id': fields.Integer(validate=validate_card_reference,
                                      required=True)
 }
@@ -0,0 +1,255 @@
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+
+# Counter columns shared by cards and users
+COUNTERS = ('todos_total', 'todos_completed', 'todos_delayed')
+
+
+class TodoCounters(object):
+    """
+    Keep per card and per user todo counters up to date.
+
+    Totals and completed counts change by deltas on every todo insert,
+    update and delete, written by Todo mapper events or, for bulk
+    statements, by the code issuing them. The delayed count depends on the
+    clock, so every write recounts it for the touched cards and users, and
+    refresh_delayed catches up todos that became overdue in the meantime.
+    """
+
+    def __init__(self, app=None):
+        """
+        Constructor function for TodoCounters.
+
+        :param app: Flask app
+        """
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Hook Todo mapper events.
+
+        :param app: Flask app
+        """
+        from app.models.todo import Todo
+
+        if not event.contains(Todo, 'after_insert', self._after_insert):
+            event.listen(Todo, 'after_insert', self._after_insert)
+            event.listen(Todo, 'after_update', self._after_update)
+            event.listen(Todo, 'after_delete', self._after_delete)
+
+    @staticmethod
+    def tables():
+        """
+        Tables holding counters, with the todo column referencing them.
+
+        :return: List of table and todo column tuples
+        """
+        from app.models.card import Card
+        from app.models.todo import Todo
+        from app.models.user import User
+
+        todos = Todo.__table__
+
+        return [(Card.__table__, todos.c.card_id), (User.__table__, todos.c.owner_id)]
+
+    @staticmethod
+    def counts(table, key, now):
+        """
+        Counter values of table rows, computed from their todos.
+
+        :param table: Cards or users table
+        :param key: Todo column referencing the table
+        :param now: Time todos become delayed at
+        :return: Dictionary of correlated count subqueries
+        """
+        from app.extensions import db
+
+        todos = key.table
+
+        def count(*criteria):
+            return db.select([db.func.count()]).where(key == table.c.id) \
+                .where(db.and_(*criteria)).as_scalar()
+
+        return {
+            'todos_total': count(),
+            'todos_completed': count(todos.c.completed),
+            'todos_delayed': count(db.not_(todos.c.completed), todos.c.due_date < now)
+        }
+
+    def update(self, connection, deltas, now=None):
+        """
+        Apply counter deltas and recount delayed todos, one statement per
+        table and distinct delta.
+
+        :param connection: Database connection or session
+        :param deltas: Dictionary of (total, completed) deltas keyed by
+            ('card' | 'user', id)
+        :param now: Time todos become delayed at
+        """
+        now = now or datetime.now()
+
+        for kind, (table, key) in zip(('card', 'user'), self.tables()):
+            groups = {}
+            for (record_type, record_id), delta in deltas.items():
+                if record_type == kind and record_id is not None:
+                    groups.setdefault(tuple(delta), []).append(record_id)
+
+            for (total, completed), ids in groups.items():
+                # Keep date_modified, its onupdate default would touch every row
+                values = {
+                    'todos_delayed': self.counts(table, key, now)['todos_delayed'],
+                    'date_modified': table.c.date_modified
+                }
+                if total:
+                    values['todos_total'] = table.c.todos_total + total
+                if completed:
+                    values['todos_completed'] = table.c.todos_completed + completed
+
+                connection.execute(table.update().where(table.c.id.in_(ids)).values(values))
+
+    def recount(self, kind, ids=None, batch_size=10000, now=None):
+        """
+        Recompute counters from the todos, set-based in id ranges. Only rows
+        with wrong counters are written.
+
+        :param kind: 'card' or 'user'
+        :param ids: IDs to recount, all rows if omitted
+        :param batch_size: Rows per statement
+        :param now: Time todos become delayed at
+        :return: Number of repaired rows
+        """
+        from app.extensions import db
+
+        table, key = dict(zip(('card', 'user'), self.tables()))[kind]
+        counts = self.counts(table, key, now or datetime.now())
+        wrong = db.or_(*[table.c[name] != counts[name] for name in COUNTERS])
+
+        # Keep date_modified, its onupdate default would touch every row
+        counts['date_modified'] = table.c.date_modified
+
+        if ids is not None:
+            return db.session.execute(
+                table.update().where(table.c.id.in_(ids)).where(wrong).values(counts)
+            ).rowcount
+
+        repaired = 0
+        last_id = db.session.scalar(db.select([db.func.max(table.c.id)])) or 0
+
+        for start in range(0, last_id, batch_size):
+            repaired += db.session.execute(
+                table.update()
+                .where(table.c.id > start)
+                .where(table.c.id <= start + batch_size)
+                .where(wrong)
+                .values(counts)
+            ).rowcount
+            db.session.commit()
+
+        return repaired
+
+    def refresh_delayed(self, since, now=None):
+        """
+        Recount delayed todos of cards and users with open todos that
+        became due since a given time.
+
+        :param since: Start of the window
+        :param now: End of the window
+        :return: Number of updated rows
+        """
+        from app.extensions import db
+        from app.models.todo import Todo
+
+        now = now or datetime.now()
+        todos = Todo.__table__
+        updated = 0
+
+        for table, key in self.tables():
+            # Served by the ix_todos_due_date_open partial index
+            ids = db.select([key]).where(db.not_(todos.c.completed)) \
+                .where(todos.c.due_date >= since) \
+                .where(todos.c.due_date < now) \
+                .where(key.isnot(None)).distinct()
+            delayed = self.counts(table, key, now)['todos_delayed']
+
+            updated += db.session.execute(
+                table.update()
+                .where(table.c.id.in_(ids))
+                .where(table.c.todos_delayed != delayed)
+                .values(todos_delayed=delayed, date_modified=table.c.date_modified)
+            ).rowcount
+
+        return updated
+
+    @staticmethod
+    def rollup(cards):
+        """
+        Add subtree counters to card rows, summing the counters of every
+        card into its ancestors along the materialized path.
+
+        :param cards: Rows with id, parent_card_id, path and counter attributes
+        :return: Dictionary of subtree counter dictionaries keyed by card ID
+        """
+        subtrees = {card.id: dict.fromkeys(COUNTERS, 0) for card in cards}
+        parents = {card.id: card.parent_card_id for card in cards}
+
+        for card in cards:
+            if card.path is not None:
+                card_ids = [int(card_id) for card_id in card.path.strip('/').split('/')]
+            else:
+                # Cards created before paths existed walk up their parents
+                card_ids = []
+                card_id = card.id
+                while card_id is not None and card_id not in card_ids:
+                    card_ids.append(card_id)
+                    card_id = parents.get(card_id)
+
+            for card_id in card_ids:
+                subtree = subtrees.get(card_id)
+                if subtree is None:
+                    continue
+
+                for name in COUNTERS:
+                    subtree[name] += getattr(card, name)
+
+        return subtrees
+
+    def _after_insert(self, mapper, connection, target):
+        completed = int(bool(target.completed))
+
+        self.update(connection, {
+            ('card', target.card_id): (1, completed),
+            ('user', target.owner_id): (1, completed)
+        })
+
+    def _after_update(self, mapper, connection, target):
+        state = inspect(target).attrs
+        card_id = state.card_id.history
+        completed = state.completed.history
+
+        if not (card_id.has_changes() or completed.has_changes() or
+                state.due_date.history.has_changes()):
+            return
+
+        old_card_id = card_id.deleted[0] if card_id.deleted else target.card_id
+        was_completed = int(bool(completed.deleted[0] if completed.deleted else target.completed))
+        is_completed = int(bool(target.completed))
+
+        deltas = {('user', target.owner_id): (0, is_completed - was_completed)}
+
+        if old_card_id == target.card_id:
+            deltas[('card', target.card_id)] = (0, is_completed - was_completed)
+        else:
+            deltas[('card', old_card_id)] = (-1, -was_completed)
+            deltas[('card', target.card_id)] = (1, is_completed)
+
+        self.update(connection, deltas)
+
+    def _after_delete(self, mapper, connection, target):
+        completed = int(bool(target.completed))
+
+        self.update(connection, {
+            ('card', target.card_id): (-1, -completed),
+            ('user', target.owner_id): (-1, -completed)
+        })
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from app.extensions import db
+from app.models.card import Card
+from app.models.todo import Todo
+from app.models.user import User
+
+# Digest sections, in email order
+DIGEST_SECTIONS = ('overdue', 'due_today', 'completed')
+
+
+def digest_window(now=None):
+    """
+    Time boundaries of a daily digest.
+
+    :param now: Digest time
+    :return: Dictionary of boundaries
+    """
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return {
+        'now': now,
+        'yesterday': today - timedelta(days=1),
+        'today': today,
+        'tomorrow': today + timedelta(days=1)
+    }
+
+
+def digest_rows(window, first_id, last_id):
+    """
+    Digest todos of a range of owners, with their card titles, in owner,
+    card and due date order. Open todos come from the open todos partial
+    index.
+
+    :param window: Digest boundaries
+    :param first_id: First owner ID
+    :param last_id: Last owner ID
+    :return: Result proxy of owner id, section, card id, card title, title
+        and due date rows
+    """
+    todos = Todo.__table__
+    cards = Card.__table__
+    owners = todos.c.owner_id.between(first_id, last_id)
+
+    pending = db.select([
+        todos.c.owner_id,
+        db.case([(todos.c.due_date < window['now'], 'overdue')],
+                else_='due_today').label('section'),
+        todos.c.card_id,
+        todos.c.title,
+        todos.c.due_date
+    ]).where(owners) \
+        .where(db.not_(todos.c.completed)) \
+        .where(todos.c.due_date < window['tomorrow'])
+
+    completed = db.select([
+        todos.c.owner_id,
+        db.literal('completed').label('section'),
+        todos.c.card_id,
+        todos.c.title,
+        todos.c.due_date
+    ]).where(owners) \
+        .where(todos.c.completed) \
+        .where(todos.c.completed_at >= window['yesterday']) \
+        .where(todos.c.completed_at < window['today'])
+
+    rows = db.union_all(pending, completed).alias('digest')
+
+    return db.session.execute(
+        db.select([rows.c.owner_id, rows.c.section, rows.c.card_id,
+                   cards.c.title.label('card_title'), rows.c.title, rows.c.due_date])
+        .select_from(rows.outerjoin(cards, cards.c.id == rows.c.card_id))
+        .order_by(rows.c.owner_id, rows.c.card_id, rows.c.due_date)
+    )
+
+
+def build_digest(rows, max_items):
+    """
+    Group the digest rows of one owner by section and card.
+
+    :param rows: Digest rows of one owner
+    :param max_items: Listed todos per section
+    :return: Dictionary of sections, each with counts and card groups
+    """
+    sections = {name: {'count': 0, 'cards': []} for name in DIGEST_SECTIONS}
+
+    for row in rows:
+        section = sections[row.section]
+        section['count'] += 1
+
+        if section['count'] > max_items:
+            continue
+
+        # Rows come in card order, so a card group is always the last one
+        if not section['cards'] or not section['cards'][-1]['id'] == row.card_id:
+            section['cards'].append({'id': row.card_id, 'title': row.card_title, 'todos': []})
+
+        section['cards'][-1]['todos'].append(row)
+
+    for section in sections.values():
+        section['more'] = max(0, section['count'] - max_items)
+
+    return sections
+
+
+def iter_digests(window, batch_size=1000, max_items=20):
+    """
+    Stream the digests of every active user with something to report,
+    fetching users and todos with two queries per batch of owners.
+
+    :param window: Digest boundaries
+    :param batch_size: Owners per batch
+    :param max_items: Listed todos per section
+    :return: Generator of lists of user and digest tuples, one per batch
+    """
+    last_id = 0
+
+    while True:
+        users = db.session.query(User.id, User.email, User.first_name) \
+            .filter(User.id > last_id, User.active.is_(True)) \
+            .order_by(User.id).limit(batch_size).all()
+
+        if not users:
+            return
+
+        first_id, last_id = users[0].id, users[-1].id
+        owners = {user.id: user for user in users}
+
+        digests = []
+        for owner_id, rows in groupby(digest_rows(window, first_id, last_id),
+                                      key=lambda row: row.owner_id):
+            user = owners.get(owner_id)
+
+            # Inactive users in the id range are still part of the scan
+            if user is not None:
+                digests.append((user, build_digest(rows, max_items)))
+
+        yield digests
@@ -0,0 +1,320 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_sqlalchemy import get_state
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker(object):
+    """
+    Stop calling a failing dependency for a cool down period after a number
+    of consecutive failures, then let a single trial call through.
+    """
+
+    def __init__(self, threshold=3, cooldown=30):
+        """
+        Constructor function for CircuitBreaker.
+
+        :param threshold: Consecutive failures opening the circuit
+        :param cooldown: Seconds the circuit stays open
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        """
+        Circuit state.
+
+        :return: 'closed', 'open' or 'half-open'
+        """
+        if self.opened_at is None:
+            return 'closed'
+
+        if time.time() - self.opened_at < self.cooldown:
+            return 'open'
+
+        return 'half-open'
+
+    def allow(self):
+        """
+        Check if a call may go through.
+
+        :return: Boolean
+        """
+        return not self.state == 'open'
+
+    def success(self):
+        """
+        Record a successful call.
+        """
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        """
+        Record a failed call.
+        """
+        self.failures += 1
+
+        if self.failures >= self.threshold or self.state == 'half-open':
+            self.opened_at = time.time()
+
+
+class TaskDispatcher(object):
+    """
+    Publish Celery tasks through a transactional outbox.
+
+    Queued tasks are written to the outbox table in the current transaction,
+    so they commit or roll back with the change that caused them. After
+    commit a background thread publishes them right away in batches over one
+    broker connection and marks them dispatched. Whatever it could not
+    publish, because the broker failed, the circuit breaker is open or the
+    process died, stays pending for the outbox relay.
+    """
+
+    def __init__(self, app=None):
+        """
+        Constructor function for TaskDispatcher.
+
+        :param app: Flask app
+        """
+        self.batch_size = 100
+        self.interval = 0.05
+        self.buffer_size = 10000
+        self.relay_batch_size = 1000
+        self.relay_delay = 10
+        self.breaker = CircuitBreaker()
+
+        self._app = None
+        self._buffer = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Read dispatch settings from app config and hook session events.
+
+        :param app: Flask app
+        """
+        self.batch_size = app.config.get('TASK_DISPATCH_BATCH_SIZE', self.batch_size)
+        self.interval = app.config.get('TASK_DISPATCH_INTERVAL', self.interval)
+        self.buffer_size = app.config.get('TASK_DISPATCH_BUFFER_SIZE', self.buffer_size)
+        self.relay_batch_size = app.config.get('OUTBOX_RELAY_BATCH_SIZE',
+                                               self.relay_batch_size)
+        self.relay_delay = app.config.get('OUTBOX_RELAY_DELAY', self.relay_delay)
+        self.breaker = CircuitBreaker(app.config.get('TASK_BREAKER_THRESHOLD', 3),
+                                      app.config.get('TASK_BREAKER_COOLDOWN', 30))
+        self._app = app
+
+        if not event.contains(Session, 'after_commit', self._after_commit):
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_transaction_end', self._after_transaction_end)
+
+    def enqueue(self, task, *args, **kwargs):
+        """
+        Write a task to the outbox, it is published once the current
+        transaction commits.
+
+        :param task: Celery task or task name
+        :param args: Task arguments
+        :param kwargs: Task keyword arguments
+        :return: Outbox message
+        """
+        from app.models.outbox import OutboxMessage
+
+        name = getattr(task, 'name', task)
+        row = OutboxMessage(name, args, kwargs)
+
+        session = get_state(current_app).db.session()
+        session.add(row)
+        session.info.setdefault('pending_tasks', []).append((row, {
+            'task': name,
+            'args': list(args),
+            'kwargs': kwargs
+        }))
+
+        return row
+
+    def relay(self, batch_size=None, delay=None):
+        """
+        Publish one batch of pending outbox messages and mark them
+        dispatched. Messages keep their Celery task id across attempts, so
+        a batch published again after a crash carries the same ids and
+        workers run each message once, see OutboxMessage.claim.
+
+        :param batch_size: Messages per batch
+        :param delay: Skip messages younger than this many seconds, the
+            dispatcher thread is still publishing those
+        :return: Number of published messages
+        """
+        from app.models.outbox import OutboxMessage
+
+        if not self.breaker.allow():
+            return 0
+
+        db = get_state(current_app).db
+        table = OutboxMessage.__table__
+        cutoff = datetime.utcnow() - timedelta(
+            seconds=self.relay_delay if delay is None else delay)
+
+        # Concurrent relays skip each other's rows on PostgreSQL
+        rows = db.session.execute(
+            db.select([table.c.id, table.c.task, table.c.payload])
+            .where(table.c.dispatched_at.is_(None))
+            .where(table.c.date_created <= cutoff)
+            .order_by(table.c.id)
+            .limit(batch_size or self.relay_batch_size)
+            .with_for_update(skip_locked=True)
+        ).fetchall()
+
+        if not rows:
+            db.session.commit()
+            return 0
+
+        published = self._publish([OutboxMessage.to_message(*row) for row in rows])
+
+        values = {'attempts': table.c.attempts + 1}
+        if published:
+            values['dispatched_at'] = datetime.utcnow()
+
+        db.session.execute(
+            table.update()
+            .where(table.c.id.in_([row.id for row in rows]))
+            .values(**values)
+        )
+        db.session.commit()
+
+        return len(rows) if published else 0
+
+    def stats(self):
+        """
+        Dispatcher state.
+
+        :return: Dictionary
+        """
+        from app.models.outbox import OutboxMessage
+
+        return {
+            'buffered': self._buffer.qsize() if self._buffer else 0,
+            'pending': OutboxMessage.query.filter(
+                OutboxMessage.dispatched_at.is_(None)).count(),
+            'breaker': self.breaker.state
+        }
+
+    def _after_commit(self, session):
+        pending = session.info.pop('pending_tasks', None)
+        if not pending:
+            return
+
+        self._ensure_thread()
+
+        for row, message in pending:
+            message['id'] = inspect(row).identity[0]
+
+            # A full buffer leaves the message to the relay
+            try:
+                self._buffer.put_nowait(message)
+            except queue.Full:
+                break
+
+    def _after_transaction_end(self, session, transaction):
+        # Drop tasks of rolled back or closed transactions
+        if transaction.parent is None:
+            session.info.pop('pending_tasks', None)
+
+    def _ensure_thread(self):
+        # Start the worker lazily, again in forked worker processes
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+
+            self._buffer = queue.Queue(self.buffer_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='task-dispatcher',
+                                            daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._buffer.get()]
+            deadline = time.time() + self.interval
+
+            # Collect more tasks for a short while
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._buffer.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            if self.breaker.allow() and self._publish(batch):
+                self._mark_dispatched([message['id'] for message in batch])
+
+    def _mark_dispatched(self, ids):
+        """
+        Mark outbox messages dispatched.
+
+        :param ids: Outbox message IDs
+        """
+        from app.models.outbox import OutboxMessage
+
+        table = OutboxMessage.__table__
+
+        try:
+            with self._app.app_context():
+                db = get_state(self._app).db
+                db.session.execute(
+                    table.update()
+                    .where(table.c.id.in_(ids))
+                    .where(table.c.dispatched_at.is_(None))
+                    .values(dispatched_at=datetime.utcnow(),
+                            attempts=table.c.attempts + 1)
+                )
+                db.session.commit()
+        except Exception:
+            # The relay publishes them again under the same task ids
+            logger.exception('Marking %d outbox messages failed', len(ids))
+
+    def _publish(self, messages):
+        """
+        Publish messages over a single broker connection.
+
+        :param messages: List of task messages
+        :return: Boolean success
+        """
+        from app.celery_worker import celery
+        from app.models.outbox import OutboxMessage
+
+        try:
+            with celery.producer_or_acquire() as producer:
+                for message in messages:
+                    celery.send_task(message['task'], args=message['args'],
+                                     kwargs=message['kwargs'],
+                                     task_id=OutboxMessage.TASK_ID_PREFIX + str(message['id']),
+                                     producer=producer, retry=False)
+        except Exception:
+            logger.exception('Publishing %d tasks failed', len(messages))
+            self.breaker.failure()
+            return False
+
+        self.breaker.success()
+        return True
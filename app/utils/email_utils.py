@@ -1,13 +1,32 @@
-from flask_mail import Message
-from app.extensions import mail
+import logging
+
+from flask import current_app
+
+from app.extensions import mail_batcher
+from app.utils.mail_utils import MailPendingError, build_message
 
 from app.celery_worker import celery
 
+logger = logging.getLogger(__name__)
+
+
+def retry_countdown(retries):
+    """
+    Exponential back off between mail retries.
+
+    :param retries: Retries so far
+    :return: Seconds to wait
+    """
+    return current_app.config.get('MAIL_RETRY_DELAY', 30) * 2 ** retries
+
 
 @celery.task()
 def send_email(subject, recipients, text_body, html_body, sender=None):
     """
-    Send email with Flask-Mail.
+    Send email with Flask-Mail over the pooled connection of the worker.
+
+    The task waits for its message, it is only batched with other emails
+    under a threads or gevent pool, see MailBatcher.
 
     :param subject: Email subject
     :param recipients: Email recipients.
@@ -15,8 +34,37 @@ def send_email(subject, recipients, text_body, html_body, sender=None):
     :param html_body: Email html
     :param sender: Authority name
     """
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    msg.html = html_body
+    msg = build_message(subject, recipients, text_body, html_body, sender)
+
+    error, = mail_batcher.send([msg], current_app.config.get('MAIL_SEND_TIMEOUT'))
+
+    # The batcher still sends a message it timed out on, a retry would send it twice
+    if isinstance(error, MailPendingError):
+        logger.warning('Mail to %s still pending after timeout', recipients)
+    elif error is not None:
+        raise error
+
+
+@celery.task(bind=True, max_retries=5)
+def send_email_batch(self, messages):
+    """
+    Send many emails over one connection, retrying only the failed ones.
+    Emails still pending after MAIL_SEND_TIMEOUT are left to the batcher.
+
+    :param messages: List of send_email keyword argument dictionaries
+    :return: Number of sent emails
+    """
+    errors = mail_batcher.send([build_message(**message) for message in messages],
+                               current_app.config.get('MAIL_SEND_TIMEOUT'))
+
+    pending = sum(isinstance(error, MailPendingError) for error in errors)
+    if pending:
+        logger.warning('%d mails still pending after timeout', pending)
+
+    failed = [(message, error) for message, error in zip(messages, errors)
+              if error is not None and not isinstance(error, MailPendingError)]
+    if failed:
+        raise self.retry(args=([message for message, error in failed],), exc=failed[0][1],
+                         countdown=retry_countdown(self.request.retries))
 
-    mail.send(msg)
+    return len(messages)
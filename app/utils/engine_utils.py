@@ -0,0 +1,161 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import Pool, QueuePool
+
+# Engine options only understood by queue pools
+POOL_SIZING_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'poolclass')
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    Queue pool keeping track of how long checkouts wait for a connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Constructor function for InstrumentedQueuePool.
+        """
+        super(InstrumentedQueuePool, self).__init__(*args, **kwargs)
+
+        # Log under the SQLAlchemy pool logger rather than the app package
+        # logger, which is at debug level in development
+        if self._echo in (False, None):
+            self.logger = logging.getLogger(QueuePool.__module__ + '.QueuePool')
+
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def recreate(self):
+        """
+        Keep counters when the pool is recreated, e.g. on engine dispose.
+        """
+        pool = super(InstrumentedQueuePool, self).recreate()
+
+        pool.checkouts = self.checkouts
+        pool.timeouts = self.timeouts
+        pool.wait_time = self.wait_time
+        pool.max_wait = self.max_wait
+
+        return pool
+
+    def _do_get(self):
+        # Waiting time includes opening a new connection when the pool is
+        # below its size
+        start = time.perf_counter()
+
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_time += elapsed
+                self.max_wait = max(self.max_wait, elapsed)
+
+
+class EngineTuning(object):
+    """
+    Apply engine option profiles and SQLite pragmas, expose pool statistics.
+
+    Server databases get SQLALCHEMY_ENGINE_OPTIONS with an instrumented queue
+    pool. File based SQLite databases get the same pool, shared across threads,
+    and SQLITE_PRAGMAS run on every new connection.
+    """
+
+    def __init__(self, app=None):
+        """
+        Constructor function for EngineTuning.
+
+        :param app: Flask app
+        """
+        self.pragmas = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Complete engine options from app config and hook connection events.
+
+        :param app: Flask app
+        """
+        self.pragmas = app.config.get('SQLITE_PRAGMAS', {})
+
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+        url = make_url(uri) if uri else None
+
+        if url is not None and url.drivername.startswith('sqlite'):
+            if url.database in (None, '', ':memory:'):
+                # In memory databases live in a single static connection
+                for key in POOL_SIZING_OPTIONS:
+                    options.pop(key, None)
+            else:
+                connect_args = dict(options.get('connect_args') or {})
+                connect_args.setdefault('check_same_thread', False)
+                options['connect_args'] = connect_args
+                options.setdefault('poolclass', InstrumentedQueuePool)
+
+        elif 'pool_size' in options:
+            options.setdefault('poolclass', InstrumentedQueuePool)
+
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+        if not event.contains(Pool, 'connect', self._on_connect):
+            event.listen(Pool, 'connect', self._on_connect)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        if not self.pragmas or not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas.items():
+            cursor.execute('PRAGMA {0} = {1}'.format(name, value))
+        cursor.close()
+
+    @staticmethod
+    def stats(engine):
+        """
+        Pool usage of an engine.
+
+        :param engine: SQLAlchemy engine
+        :return: Dictionary of pool statistics
+        """
+        pool = engine.pool
+        stats = {
+            'pool': type(pool).__name__,
+            'status': pool.status()
+        }
+
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow()
+            })
+
+        if isinstance(pool, InstrumentedQueuePool):
+            stats.update({
+                'checkouts': pool.checkouts,
+                'timeouts': pool.timeouts,
+                'wait_ms_total': round(pool.wait_time * 1000, 2),
+                'wait_ms_avg': round(pool.wait_time * 1000 / pool.checkouts, 3)
+                if pool.checkouts else 0.0,
+                'wait_ms_max': round(pool.max_wait * 1000, 2)
+            })
+
+        return stats
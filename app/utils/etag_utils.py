@@ -0,0 +1,82 @@
+import hashlib
+
+from functools import wraps
+
+from flask import request, make_response, Response
+
+from flask_login import current_user
+
+from sqlalchemy import and_, func, select
+
+from app.extensions import db
+
+
+# Utilities
+def make_etag(*parts):
+    """
+    Hash ETag parts into an opaque tag.
+
+    :param parts: Values describing the response state
+    :return: ETag string
+    """
+    raw = '|'.join(str(part) for part in parts)
+
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_scope_stats(*scopes):
+    """
+    Fetch row count and last modification date of each scope in one query.
+
+    Columns written without touching date_modified, like todo counters, are
+    summed as well when a scope lists them.
+
+    :param scopes: Tuples of model, filter criteria list and optionally
+        names of columns to sum
+    :return: Flat list of counts, dates and sums
+    """
+
+    columns = []
+    for model, criteria, *sums in scopes:
+        where = and_(*criteria)
+        columns.append(select([func.count(model.id)]).where(where).as_scalar())
+        columns.append(select([func.max(model.date_modified)]).where(where).as_scalar())
+
+        for name in (sums[0] if sums else ()):
+            columns.append(select([func.sum(getattr(model, name))]).where(where).as_scalar())
+
+    return list(db.session.query(*columns).one())
+
+
+def conditional_response(get_etag_parts):
+    """
+    Answer GET requests with 304 when the client copy is still current.
+
+    The ETag parts are computed from a cheap aggregate before the view runs,
+    so unchanged data is never loaded or serialized.
+
+    :param get_etag_parts: Function returning ETag parts for view kwargs
+    :return: Route function decorator
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = make_etag(current_user.id, request.full_path,
+                             *get_etag_parts(**kwargs))
+
+            # Client copy is current
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag, weak=True)
+                return response
+
+            response = make_response(f(*args, **kwargs))
+
+            if response.status_code == 200:
+                response.set_etag(etag, weak=True)
+
+            return response
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,249 @@
+import logging
+import os
+import queue
+import smtplib
+import socket
+import threading
+import time
+
+from concurrent.futures import Future, wait
+
+from flask_mail import Message
+
+logger = logging.getLogger(__name__)
+
+# Errors leaving the SMTP connection unusable, the message is tried once more
+# on a new connection
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout)
+
+
+class MailPendingError(TimeoutError):
+    """
+    Message still queued or being sent when the wait timed out. The batcher
+    keeps sending it, so it must not be sent again.
+    """
+
+
+def build_message(subject, recipients, text_body, html_body, sender=None):
+    """
+    Build a Flask-Mail message.
+
+    :param subject: Email subject
+    :param recipients: Email recipients
+    :param text_body: Email raw text
+    :param html_body: Email html
+    :param sender: Authority name
+    :return: Message
+    """
+    msg = Message(subject, sender=sender, recipients=recipients)
+    msg.body = text_body
+    msg.html = html_body
+
+    return msg
+
+
+class MailBatcher(object):
+    """
+    Send mail in batches over one pooled SMTP connection.
+
+    Messages submitted from any thread of a worker process are collected for
+    MAIL_BATCH_WINDOW seconds or up to MAIL_BATCH_SIZE messages and sent by a
+    background thread. The connection stays open between batches until it
+    was idle for MAIL_CONNECTION_IDLE seconds. A failing message only fails
+    itself, a dropped connection is reopened and the message tried again.
+
+    Callers wait for their messages, so messages of one Celery task only
+    share batches with other tasks under a threads or gevent pool. Prefork
+    workers run one task at a time and only keep the pooled connection.
+    """
+
+    def __init__(self, app=None):
+        """
+        Constructor function for MailBatcher.
+
+        :param app: Flask app
+        """
+        self.batch_size = 50
+        self.window = 0.1
+        self.idle_timeout = 30
+
+        self.sent = 0
+        self.failed = 0
+        self.connections = 0
+
+        self._app = None
+        self._buffer = None
+        self._thread = None
+        self._pid = None
+        self._connection = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Read batch settings from app config.
+
+        :param app: Flask app
+        """
+        self.batch_size = app.config.get('MAIL_BATCH_SIZE', self.batch_size)
+        self.window = app.config.get('MAIL_BATCH_WINDOW', self.window)
+        self.idle_timeout = app.config.get('MAIL_CONNECTION_IDLE', self.idle_timeout)
+        self._app = app
+
+    def submit(self, message):
+        """
+        Queue a message for the next batch.
+
+        :param message: Flask-Mail message
+        :return: Future resolving once the message was sent
+        """
+        if self._app is None:
+            raise RuntimeError('MailBatcher.init_app was not called.')
+
+        self._ensure_thread()
+
+        future = Future()
+        self._buffer.put((message, future))
+
+        return future
+
+    def send(self, messages, timeout=None):
+        """
+        Send messages and wait for the result of each.
+
+        :param messages: List of Flask-Mail messages
+        :param timeout: Seconds to wait for the batch
+        :return: List with None for every sent message, the error otherwise,
+            MailPendingError for messages still being sent
+        """
+        futures = [self.submit(message) for message in messages]
+        wait(futures, timeout)
+
+        return [future.exception(0) if future.done() else MailPendingError('Mail not sent in time')
+                for future in futures]
+
+    def stats(self):
+        """
+        Batcher counters.
+
+        :return: Dictionary
+        """
+        return {
+            'buffered': self._buffer.qsize() if self._buffer else 0,
+            'sent': self.sent,
+            'failed': self.failed,
+            'connections': self.connections
+        }
+
+    def _ensure_thread(self):
+        # Start the sender lazily, again in forked worker processes and
+        # after it died
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and \
+                    self._pid == os.getpid():
+                return
+
+            # Messages queued in this process wait for the new sender
+            if self._pid != os.getpid():
+                self._buffer = queue.Queue()
+                self._pid = os.getpid()
+
+            self._connection = None
+            self._thread = threading.Thread(target=self._run, name='mail-batcher',
+                                            daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._buffer.get(timeout=self.idle_timeout)]
+            except queue.Empty:
+                self._close()
+                continue
+
+            deadline = time.time() + self.window
+
+            # Collect more messages for a short while
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._buffer.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            # An unexpected error fails the rest of the batch, not the sender
+            try:
+                with self._app.app_context():
+                    for message, future in batch:
+                        error = self._deliver(message)
+
+                        if error is None:
+                            self.sent += 1
+                            future.set_result(None)
+                        else:
+                            self.failed += 1
+                            future.set_exception(error)
+            except Exception as e:
+                logger.exception('Sending a batch of %d mails failed', len(batch))
+                self._close()
+
+                for message, future in batch:
+                    if not future.done():
+                        self.failed += 1
+                        future.set_exception(e)
+
+    def _deliver(self, message):
+        """
+        Send a message over the pooled connection.
+
+        :param message: Flask-Mail message
+        :return: None or the error
+        """
+        for attempt in range(2):
+            try:
+                message.send(self._connect())
+                return None
+            except CONNECTION_ERRORS as e:
+                logger.warning('SMTP connection lost: %s', e)
+                self._close()
+                error = e
+            except Exception as e:
+                logger.exception('Sending mail to %s failed', message.recipients)
+                return e
+
+        return error
+
+    def _connect(self):
+        """
+        Open the pooled connection if needed.
+
+        :return: Flask-Mail connection
+        """
+        if self._connection is None:
+            from app.extensions import mail
+
+            connection = mail.connect()
+            connection.__enter__()
+
+            self._connection = connection
+            self.connections += 1
+
+        return self._connection
+
+    def _close(self):
+        """
+        Close the pooled connection.
+        """
+        connection, self._connection = self._connection, None
+
+        if connection is None or connection.host is None:
+            return
+
+        try:
+            connection.host.quit()
+        except Exception:
+            connection.host.close()
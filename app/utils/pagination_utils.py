@@ -0,0 +1,152 @@
+import base64
+import json
+
+from datetime import datetime
+
+from flask import current_app
+
+from sqlalchemy import and_, or_, tuple_
+
+from webargs import fields, ValidationError
+
+
+# Utilities
+def encode_cursor(date_created, id):
+    """
+    Create an opaque page cursor.
+
+    :param date_created: Last row creation date
+    :param id: Last row ID
+    :return: Cursor string
+    """
+    raw = json.dumps([date_created.isoformat(), id])
+
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Read an opaque page cursor.
+
+    :param cursor: Cursor string
+    :return: Tuple of last row creation date and ID
+    """
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    date_created, id = json.loads(raw)
+
+    return parse_isoformat(date_created), int(id)
+
+
+def parse_isoformat(value):
+    """
+    Read a naive datetime written by datetime.isoformat.
+
+    :param value: Datetime string
+    :return: Datetime
+    """
+    date_format = '%Y-%m-%dT%H:%M:%S'
+    if '.' in value:
+        date_format += '.%f'
+
+    return datetime.strptime(value, date_format)
+
+
+def supports_row_values(dialect):
+    """
+    Check if a dialect compares row values, e.g. `(a, b) > (1, 2)`, which
+    the database can answer with a single index range.
+
+    :param dialect: SQLAlchemy dialect
+    :return: Boolean
+    """
+    if dialect.name == 'sqlite':
+        return dialect.dbapi.sqlite_version_info >= (3, 15)
+
+    return dialect.name == 'postgresql'
+
+
+def keyset_after(dialect, columns, values):
+    """
+    Filter criteria matching rows sorted after a keyset position.
+
+    :param dialect: SQLAlchemy dialect
+    :param columns: Sort columns, e.g. (date_created, id)
+    :param values: Values of the last row
+    :return: Filter criteria
+    """
+    if supports_row_values(dialect):
+        return tuple_(*columns) > tuple_(*values)
+
+    # Expanded form for databases without row value comparison
+    criteria = columns[-1] > values[-1]
+    for column, value in zip(reversed(columns[:-1]), reversed(values[:-1])):
+        criteria = or_(column > value, and_(column == value, criteria))
+
+    return criteria
+
+
+def keyset_paginate(query, model, limit, cursor=None):
+    """
+    Paginate query on (date_created, id) so every page costs the same.
+
+    Pagination is opt-in, without limit and cursor every row is returned
+    from a query that fetches rows in chunks.
+
+    :param query: Query to paginate
+    :param model: Queried model
+    :param limit: Page size
+    :param cursor: Cursor of the previous page
+    :return: Tuple of page rows and next page cursor
+    """
+
+    query = query.order_by(model.date_created, model.id)
+
+    if limit is None:
+        if not cursor:
+            return query.yield_per(current_app.config['YIELD_PER']), None
+
+        limit = current_app.config['PAGE_SIZE']
+
+    if cursor:
+        query = query.filter(keyset_after(query.session.bind.dialect,
+                                          (model.date_created, model.id),
+                                          decode_cursor(cursor)))
+
+    rows = query.limit(limit + 1).all()
+
+    # Extra row tells if there is a next page
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date_created, rows[-1].id)
+
+    return rows, next_cursor
+
+
+# Request validators
+def validate_limit(limit):
+    """
+    Check page size bounds.
+    :param limit: Page size
+    """
+    if not 1 <= limit <= current_app.config['PAGE_SIZE_MAX']:
+        raise ValidationError('Limit must be between 1 and {0}.'.format(
+            current_app.config['PAGE_SIZE_MAX']))
+
+
+def validate_cursor(cursor):
+    """
+    Check page cursor format.
+    :param cursor: Cursor string
+    """
+    try:
+        decode_cursor(cursor)
+    except Exception:
+        raise ValidationError('Invalid cursor.')
+
+
+# Pagination args
+pagination_args = {
+    'limit': fields.Integer(validate=[validate_limit], missing=None),
+    'cursor': fields.String(validate=[validate_cursor], missing=None)
+}
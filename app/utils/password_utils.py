@@ -0,0 +1,111 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask_bcrypt import Bcrypt
+
+
+class HasherBusyError(Exception):
+    """
+    Raised when the password hasher can not take more work.
+    """
+    pass
+
+
+class PasswordHasher(object):
+    """
+    Run bcrypt hashing and verification on a dedicated bounded thread pool.
+
+    At most BCRYPT_WORKERS hashes run at once and BCRYPT_QUEUE_SIZE more may
+    wait for a worker, any call beyond that fails fast with HasherBusyError.
+    """
+
+    def __init__(self, app=None):
+        """
+        Constructor function for PasswordHasher.
+
+        :param app: Flask app
+        """
+        self.rounds = 12
+        self.workers = 4
+        self.queue_size = 32
+        self.timeout = 10
+
+        self._bcrypt = None
+        self._executor = None
+        self._slots = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Read hasher settings from app config and create the thread pool.
+
+        :param app: Flask app
+        """
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.workers = app.config.get('BCRYPT_WORKERS', self.workers)
+        self.queue_size = app.config.get('BCRYPT_QUEUE_SIZE', self.queue_size)
+        self.timeout = app.config.get('BCRYPT_TIMEOUT', self.timeout)
+
+        self._bcrypt = Bcrypt(app)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+
+    def hash(self, password):
+        """
+        Hash a password with the configured cost.
+
+        :param password: Raw password
+        :return: Password hash
+        """
+        return self._run(self._bcrypt.generate_password_hash, password, self.rounds)
+
+    def verify(self, pw_hash, password):
+        """
+        Check a password against a hash.
+
+        :param pw_hash: Password hash
+        :param password: Raw password
+        :return: Boolean
+        """
+        return self._run(self._bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """
+        Check if a hash was created with a different cost.
+
+        :param pw_hash: Password hash
+        :return: Boolean
+        """
+        if isinstance(pw_hash, bytes):
+            pw_hash = pw_hash.decode()
+
+        # Hash format is $<version>$<cost>$<salt and checksum>
+        return int(pw_hash.split('$')[2]) != self.rounds
+
+    def _run(self, fn, *args):
+        """
+        Run a function on the thread pool and wait for the result.
+
+        :param fn: Function
+        :param args: Function arguments
+        :return: Function result
+        """
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusyError('Password hasher queue is full.')
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda f: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusyError('Password hasher timed out.')
@@ -0,0 +1,81 @@
+from functools import wraps
+
+from flask_login import current_user
+from webargs import ValidationError
+
+from app.extensions import db
+from app.utils.views_utils import json_response_with_error
+
+
+def load_resource(model, id_arg, name, errors, options=()):
+    """
+    Route decorator loading a row of the current user with a single
+    `WHERE id = ? AND owner_id = ?` query and passing it to the view as a
+    keyword argument. Rows of other users are never loaded.
+
+    :param model: Model class with an owner_id column
+    :param id_arg: Route keyword argument holding the ID
+    :param name: View keyword argument receiving the row
+    :param errors: Dictionary of 'missing', 'denied' and 'message' texts
+    :param options: Query options of the endpoint, e.g. eager loading
+    :return: Route function decorator
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            resource = model.query.options(*options) \
+                .filter(model.id == kwargs[id_arg], model.owner_id == current_user.id) \
+                .first()
+
+            # Through error response
+            if resource is None:
+                return json_response_with_error(
+                    code=422,
+                    errors={
+                        id_arg: [errors[check_ownership(model, [kwargs[id_arg]])[kwargs[id_arg]]]]
+                    },
+                    message=errors['message']
+                )
+
+            kwargs[name] = resource
+
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+def check_ownership(model, ids, owner_id=None):
+    """
+    Check existence and ownership of rows with one `IN (...)` query.
+
+    :param model: Model class with an owner_id column
+    :param ids: Row IDs
+    :param owner_id: Owner user ID, the current user if omitted
+    :return: Dictionary of None, 'missing' or 'denied' keyed by ID
+    """
+    owner_id = current_user.id if owner_id is None else owner_id
+    owners = dict(db.session.query(model.id, model.owner_id).filter(model.id.in_(ids)))
+
+    return {resource_id: None if owners.get(resource_id) == owner_id else
+            'denied' if resource_id in owners else 'missing'
+            for resource_id in ids}
+
+
+def validate_reference(model, errors):
+    """
+    Build a webargs validator checking that a referenced row exists and
+    belongs to the current user, with one query.
+
+    :param model: Model class with an owner_id column
+    :param errors: Dictionary of 'missing' and 'denied' texts
+    :return: Validator function
+    """
+    def validate(resource_id):
+        error = check_ownership(model, [resource_id])[resource_id]
+
+        if error is not None:
+            raise ValidationError(errors[error])
+
+    return validate
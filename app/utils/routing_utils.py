@@ -0,0 +1,153 @@
+from functools import wraps
+
+from flask import _request_ctx_stack, current_app, has_request_context, request
+from flask_login import current_user
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event, orm
+
+REPLICA_BIND = 'replica'
+
+# Signed last write marker, sent as a cookie and a response header
+LAST_WRITE_COOKIE = 'last_write'
+LAST_WRITE_HEADER = 'Last-Write'
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session sending reads of replica routed requests to the replica bind.
+
+    Flushes, models with their own bind key and requests of users who wrote
+    in the last REPLICA_STICKY_SECONDS always use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        """
+        Return the engine for a given model or statement.
+
+        :param mapper: Mapper
+        :param clause: Statement
+        :return: Engine
+        """
+        if self._flushing or not self._use_replica():
+            return SignallingSession.get_bind(self, mapper, clause)
+
+        if mapper is not None and mapper.persist_selectable.info.get('bind_key'):
+            return SignallingSession.get_bind(self, mapper, clause)
+
+        return get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+
+    def _use_replica(self):
+        # Flag lives on the request context, the app context and its g may
+        # outlive a request, e.g. in tests
+        return has_request_context() and \
+            getattr(_request_ctx_stack.top, 'use_replica', False) and \
+            REPLICA_BIND in (self.app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    SQLAlchemy extension with an optional read replica bind, so users read
+    their own writes.
+
+    Requests committing a write get a signed marker of the writing user in
+    a cookie and a Last-Write response header. Clients send it back, as the
+    cookie or the Last-Write request header, and keep reading from the
+    primary while it is younger than REPLICA_STICKY_SECONDS, whichever
+    process serves them.
+    """
+
+    def init_app(self, app):
+        """
+        Register the extension and the last write marker hook.
+
+        :param app: Flask app
+        """
+        super(RoutingSQLAlchemy, self).init_app(app)
+
+        app.after_request(self._set_last_write)
+
+    def create_session(self, options):
+        """
+        Create the session factory, recording writers after every commit.
+        Commits also cover statements run with session.execute, which never
+        flush.
+
+        :param options: Session options
+        :return: Session factory
+        """
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+        event.listen(factory, 'after_commit', self._record_writer)
+
+        return factory
+
+    def recently_wrote(self, user_id):
+        """
+        Check if an user wrote within the sticky window, in this request or
+        according to the marker the client sent.
+
+        :param user_id: User ID
+        :return: Boolean
+        """
+        if getattr(_request_ctx_stack.top, 'last_writer', None) == user_id:
+            return True
+
+        marker = request.headers.get(LAST_WRITE_HEADER) or \
+            request.cookies.get(LAST_WRITE_COOKIE)
+        if not marker:
+            return False
+
+        try:
+            writer = self._last_write_serializer().loads(
+                marker, max_age=current_app.config.get('REPLICA_STICKY_SECONDS', 5))
+        except BadSignature:
+            return False
+
+        return writer == user_id
+
+    def _last_write_serializer(self):
+        return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='last-write')
+
+    def _record_writer(self, session):
+        # Avoid triggering the user loader, only use an already loaded user
+        if not has_request_context():
+            return
+
+        user = getattr(_request_ctx_stack.top, 'user', None)
+        if user is None or not user.is_authenticated:
+            return
+
+        _request_ctx_stack.top.last_writer = user.id
+
+    def _set_last_write(self, response):
+        # Only replica routed deployments need the marker
+        user_id = getattr(_request_ctx_stack.top, 'last_writer', None)
+        if user_id is None or \
+                REPLICA_BIND not in (current_app.config.get('SQLALCHEMY_BINDS') or {}):
+            return response
+
+        marker = self._last_write_serializer().dumps(user_id)
+        response.headers[LAST_WRITE_HEADER] = marker
+        response.set_cookie(LAST_WRITE_COOKIE, marker, httponly=True,
+                            max_age=current_app.config.get('REPLICA_STICKY_SECONDS', 5))
+
+        return response
+
+
+def use_replica(f):
+    """
+    Serve a read only view from the replica, unless the current user wrote
+    recently. Place it below login_required.
+    :param f: Route function
+    :return: Route function
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        db = get_state(current_app).db
+
+        _request_ctx_stack.top.use_replica = not (current_user.is_authenticated and
+                                                  db.recently_wrote(current_user.id))
+
+        return f(*args, **kwargs)
+
+    return decorated_function
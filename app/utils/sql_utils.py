@@ -0,0 +1,269 @@
+import json
+import re
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+
+from flask import current_app, g, request
+
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+
+# Plan lines of full table scans, e.g. 'SCAN todos' or 'Seq Scan on todos'
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+POSTGRESQL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+class QueryStats(object):
+    """
+    Statements and database time recorded over a span of work.
+    """
+
+    def __init__(self, capture=False):
+        """
+        Constructor function for QueryStats.
+
+        :param capture: Keep every statement with its parameters
+        """
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.queries = [] if capture else None
+
+    def record(self, statement, duration, parameters=None, engine=None):
+        """
+        Record an executed statement.
+
+        :param statement: SQL statement with parameter placeholders
+        :param duration: Execution time in seconds
+        :param parameters: Statement parameters
+        :param engine: Engine the statement ran on
+        """
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+        if self.queries is not None:
+            self.queries.append((engine, statement, parameters))
+
+    def repeated(self, threshold):
+        """
+        Statements run at least `threshold` times with different parameters,
+        which usually points at an N+1 query pattern.
+
+        :param threshold: Minimum executions
+        :return: List of statement and count tuples
+        """
+        return [(statement, count)
+                for statement, count in self.statements.most_common()
+                if count >= threshold]
+
+
+class QueryInstrumentation(object):
+    """
+    Count statements and database time per request.
+
+    Listens on every SQLAlchemy engine, so binds created later are covered
+    as well. Each request gets a Server-Timing header and a structured log
+    line keyed by its endpoint. Streamed responses run their queries while
+    the body is written, so they are logged once the body is closed and get
+    no header.
+    """
+
+    def __init__(self, app=None):
+        """
+        Constructor function for QueryInstrumentation.
+
+        :param app: Flask app
+        """
+        self.repeat_threshold = 5
+        self._local = threading.local()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Hook engine events and request handlers.
+
+        :param app: Flask app
+        """
+        self.repeat_threshold = app.config.get('SQL_REPEAT_THRESHOLD',
+                                               self.repeat_threshold)
+
+        if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+
+        if app.config.get('SQL_INSTRUMENTATION', True):
+            app.before_request(self._start_request)
+            app.after_request(self._finish_request)
+            app.teardown_request(self._teardown_request)
+
+    @property
+    def recorders(self):
+        """
+        Recorders active on the current thread.
+
+        :return: List of QueryStats
+        """
+        if not hasattr(self._local, 'recorders'):
+            self._local.recorders = []
+
+        return self._local.recorders
+
+    @contextmanager
+    def record(self, capture=False):
+        """
+        Record statements executed on the current thread inside the block.
+
+        :param capture: Keep every statement with its parameters
+        :return: QueryStats
+        """
+        stats = QueryStats(capture)
+        self.recorders.append(stats)
+
+        try:
+            yield stats
+        finally:
+            self.recorders.remove(stats)
+
+    @contextmanager
+    def query_budget(self, max_queries):
+        """
+        Fail when the block runs more than `max_queries` statements.
+
+        :param max_queries: Query budget
+        :return: QueryStats
+        """
+        with self.record() as stats:
+            yield stats
+
+        if stats.count > max_queries:
+            raise AssertionError(
+                'Expected at most {0} queries, got {1}:\n{2}'.format(
+                    max_queries, stats.count,
+                    '\n'.join('{0}x {1}'.format(count, statement)
+                              for statement, count in stats.statements.most_common())
+                )
+            )
+
+    @contextmanager
+    def assert_indexed(self):
+        """
+        Fail when a query run inside the block falls back to a full table
+        scan. Every SELECT is explained after the block, PostgreSQL plans
+        are taken with sequential scans disabled so small test tables do
+        not hide a missing index.
+
+        :return: QueryStats
+        """
+        with self.record(capture=True) as stats:
+            yield stats
+
+        failures = []
+        for engine, statement, parameters in stats.queries:
+            if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                continue
+
+            tables = full_scans(engine, statement, parameters)
+            if tables:
+                failures.append('{0}: {1}'.format(', '.join(tables), statement))
+
+        if failures:
+            raise AssertionError('Full table scans:\n' + '\n'.join(failures))
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        duration = time.perf_counter() - conn.info['query_start_time'].pop()
+
+        for stats in self.recorders:
+            stats.record(statement, duration, parameters, conn.engine)
+
+    def _start_request(self):
+        stats = QueryStats()
+        self.recorders.append(stats)
+        g.query_stats = stats
+
+    def _finish_request(self, response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+
+        # Headers are gone by the time a streamed body has run its queries
+        if response.is_streamed:
+            response.call_on_close(partial(
+                self._log_request, current_app._get_current_object(), stats,
+                request.endpoint, request.method, response.status_code))
+            return response
+
+        response.headers.add('Server-Timing', 'db;dur={0:.2f};desc="{1} queries"'.format(
+            stats.duration * 1000, stats.count))
+
+        self._log_request(current_app, stats, request.endpoint, request.method,
+                          response.status_code)
+
+        return response
+
+    def _log_request(self, app, stats, endpoint, method, status):
+        repeated = stats.repeated(self.repeat_threshold)
+        line = json.dumps({
+            'endpoint': endpoint,
+            'method': method,
+            'status': status,
+            'queries': stats.count,
+            'db_ms': round(stats.duration * 1000, 2),
+            'repeated': [{'statement': statement, 'count': count}
+                         for statement, count in repeated]
+        })
+
+        if repeated:
+            app.logger.warning('sql %s', line)
+        else:
+            app.logger.info('sql %s', line)
+
+    def _teardown_request(self, exception=None):
+        stats = g.pop('query_stats', None)
+        if stats is not None and stats in self.recorders:
+            self.recorders.remove(stats)
+
+
+def full_scans(engine, statement, parameters):
+    """
+    Tables a statement reads with a full table scan, from its query plan.
+
+    :param engine: Engine to explain the statement on
+    :param statement: SQL statement with parameter placeholders
+    :param parameters: Statement parameters
+    :return: List of table names
+    """
+    dialect = engine.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        return []
+
+    tables = set(inspect(engine).get_table_names())
+    connection = engine.raw_connection()
+
+    try:
+        cursor = connection.cursor()
+
+        if dialect == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            matches = (SQLITE_SCAN.match(row[-1]) for row in cursor.fetchall())
+        else:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + statement, parameters)
+            matches = (POSTGRESQL_SCAN.search(row[0]) for row in cursor.fetchall())
+
+        return sorted({match.group(1) for match in matches
+                       if match and match.group(1) in tables})
+    finally:
+        connection.rollback()
+        connection.close()
@@ -0,0 +1,146 @@
+import base64
+import json
+
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+
+from webargs import fields, ValidationError
+
+from .pagination_utils import keyset_after, parse_isoformat, validate_limit
+
+# Paged sync streams
+SYNC_STREAMS = ('cards', 'todos', 'deleted')
+
+
+# Utilities
+def get_watermark():
+    """
+    Create a sync watermark.
+
+    The watermark lags behind the clock so rows stamped by transactions
+    still in flight are sent again on the next sync instead of being missed.
+
+    :return: Naive UTC datetime
+    """
+    lag = timedelta(seconds=current_app.config['SYNC_WATERMARK_LAG'])
+
+    return datetime.utcnow() - lag
+
+
+def get_retention_cutoff():
+    """
+    Oldest watermark a client may sync from. Tombstones older than it are
+    never read again and can be purged.
+
+    :return: Naive UTC datetime
+    """
+    return datetime.utcnow() - timedelta(days=current_app.config['SYNC_RETENTION_DAYS'])
+
+
+def to_utc(value):
+    """
+    Convert a datetime to naive UTC as stored in the database.
+
+    :param value: Datetime
+    :return: Naive UTC datetime
+    """
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return value
+
+
+def encode_sync_cursor(state):
+    """
+    Create an opaque sync cursor.
+
+    :param state: Sync state with watermark, since and the (date_modified,
+        id) position of every unfinished stream
+    :return: Cursor string
+    """
+    raw = json.dumps({
+        'watermark': state['watermark'].isoformat(),
+        'since': state['since'].isoformat() if state['since'] else None,
+        'positions': {stream: [position[0].isoformat(), position[1]] if position else None
+                      for stream, position in state['positions'].items()}
+    })
+
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_sync_cursor(cursor):
+    """
+    Read an opaque sync cursor.
+
+    :param cursor: Cursor string
+    :return: Sync state
+    """
+    raw = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+    return {
+        'watermark': parse_isoformat(raw['watermark']),
+        'since': parse_isoformat(raw['since']) if raw['since'] else None,
+        'positions': {stream: (parse_isoformat(position[0]), int(position[1])) if position else None
+                      for stream, position in raw['positions'].items()
+                      if stream in SYNC_STREAMS}
+    }
+
+
+def sync_page(query, model, since, position, limit):
+    """
+    Fetch the next page of a sync stream in (date_modified, id) order.
+
+    :param query: Stream query
+    :param model: Queried model
+    :param since: Sync watermark
+    :param position: Position of the last row sent, None on the first page
+    :param limit: Page size
+    :return: Tuple of rows and the next position, None once the stream ends
+    """
+    if position is not None:
+        query = query.filter(keyset_after(query.session.bind.dialect,
+                                          (model.date_modified, model.id), position))
+    elif since is not None:
+        query = query.filter(model.date_modified >= since)
+
+    rows = query.order_by(model.date_modified, model.id).limit(limit + 1).all()
+
+    # Extra row tells if there is a next page
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1].date_modified, rows[-1].id)
+
+    return rows, None
+
+
+# Request validators
+def validate_since(since):
+    """
+    Reject watermarks older than the tombstone retention.
+    :param since: Sync watermark
+    """
+    if to_utc(since) < get_retention_cutoff():
+        raise ValidationError('Watermark expired, sync again without since.')
+
+
+def validate_sync_cursor(cursor):
+    """
+    Check sync cursor format and age.
+    :param cursor: Cursor string
+    """
+    try:
+        state = decode_sync_cursor(cursor)
+    except Exception:
+        raise ValidationError('Invalid cursor.')
+
+    if state['since'] and state['since'] < get_retention_cutoff():
+        raise ValidationError('Watermark expired, sync again without since.')
+
+
+# Sync args
+sync_args = {
+    'since': fields.DateTime(validate=[validate_since], missing=None),
+    'limit': fields.Integer(validate=[validate_limit], missing=None),
+    'cursor': fields.String(validate=[validate_sync_cursor], missing=None)
+}
@@ -1,75 +1,398 @@
 from datetime import datetime
 
-from functools import wraps
+from marshmallow import Schema
+from webargs import fields, validate, ValidationError
 
-from webargs import fields, validate
+from flask import current_app, request
 
 from flask_login import current_user
 
-from app.utils.views_utils import json_response_with_error
+from app.utils.etag_utils import get_scope_stats
+from app.utils.resource_utils import load_resource
 
-from .card_utils import validate_card_existent, validate_ownership
+from .card_utils import validate_card_reference
+from .pagination_utils import keyset_after
 
+from app.extensions import db, todo_counters
+from app.models.card import Card
 from app.models.todo import Todo
+from app.models.tombstone import Tombstone
 
 
 # Utilities
-def validate_todo_id(f):
-    """
-    Validate todo id decorator.
-    :param f: Route function
-    :return: Route function | Error
-    """
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        todo = Todo.query.get(kwargs['todo_id'])
-
-        # Check existent and ownership
-        error = None
-        if todo:
-            if not todo.owner_id == current_user.id:
-                error = ['You are not the real owner of this Todo.']
-        else:
-            error = ['Invalid Todo id.']
-
-        # Through error response
-        if error:
-            return json_response_with_error(
-                code=422,
-                errors={
-                    'todo_id': error
-                },
-                message='Todo ID is invalid or access denied.'
-            )
+todo_id_errors = {
+    'missing': 'Invalid Todo id.',
+    'denied': 'You are not the real owner of this Todo.',
+    'message': 'Todo ID is invalid or access denied.'
+}
 
-        return f(*args, **kwargs)
 
-    return decorated_function
+def load_todo(*options):
+    """
+    Load the route todo of the current user and pass it to the view as
+    `todo`, see load_resource.
+    :param options: Query options of the endpoint
+    :return: Route function decorator
+    """
+    return load_resource(Todo, 'todo_id', 'todo', todo_id_errors, options)
 
 
 def get_todo_list(state='all'):
     """
     Get todo list.
     :param state: Todo sate
-    :return Todo lists
+    :return Todo list query
     """
 
     if state == 'completed':
-        todos = Todo.query.filter_by(owner_id=current_user.id, completed=True).all()
+        todos = Todo.query.filter_by(owner_id=current_user.id, completed=True)
 
     elif state == 'incomplete':
-        todos = Todo.query.filter_by(owner_id=current_user.id, completed=False).all()
+        todos = Todo.query.filter_by(owner_id=current_user.id, completed=False)
 
     elif state == 'delayed':
-        todos = Todo.query.filter(Todo.owner_id == current_user.id, Todo.completed < 1,
-                                  Todo.due_date < datetime.now()).all()
+        todos = Todo.query.filter_by(owner_id=current_user.id, completed=False) \
+            .filter(Todo.due_date < datetime.now())
 
     else:
-        todos = Todo.query.filter_by(owner_id=current_user.id).all()
+        todos = Todo.query.filter_by(owner_id=current_user.id)
 
     return todos
 
 
+def get_todo_etag_parts(todo_id, todo):
+    """
+    ETag parts of a single todo.
+    :param todo_id: Todo ID
+    :param todo: Todo
+    :return: List of ETag parts
+    """
+    return [todo.id, todo.date_modified]
+
+
+def get_todo_list_etag_parts():
+    """
+    ETag parts of the todo list.
+    :return: List of ETag parts
+    """
+    state = request.args.get(key='state', default='all', type=str)
+
+    return get_scope_stats(
+        (Todo, [get_todo_list(state).whereclause])
+    )
+
+
+def get_batch_owners(todo_ids, card_ids):
+    """
+    Owners of every referenced todo and card, fetched with a single query.
+    :param todo_ids: Todo IDs
+    :param card_ids: Card IDs
+    :return: Dictionary of owner IDs keyed by ('todo' | 'card', id)
+    """
+
+    queries = []
+    for record_type, model, ids in (('todo', Todo, todo_ids), ('card', Card, card_ids)):
+        if ids:
+            queries.append(
+                db.select([db.literal(record_type), model.id, model.owner_id])
+                .where(model.id.in_(ids))
+            )
+
+    if not queries:
+        return {}
+
+    statement = queries[0] if len(queries) == 1 else db.union_all(*queries)
+
+    return {(record_type, record_id): owner_id
+            for record_type, record_id, owner_id in db.session.execute(statement)}
+
+
+def apply_todo_batch(owner_id, operations):
+    """
+    Validate and apply a batch of todo operations in one transaction.
+
+    Operations are grouped by type and run as set-based statements: creates,
+    then updates, then completes, then deletes. Invalid operations are
+    reported and skipped, the rest are applied.
+
+    :param owner_id: Owner user ID
+    :param operations: List of operation dictionaries with an `op` key
+    :return: List of per operation results, in request order
+    """
+
+    results = [None] * len(operations)
+    valid = {op: [] for op in batch_schemas}
+
+    # Validate input
+    for index, operation in enumerate(operations):
+        op = operation.get('op')
+        schema = batch_schemas.get(op)
+
+        if schema is None:
+            results[index] = batch_result(op, 422, errors={'op': ['Unknown operation.']})
+            continue
+
+        data, errors = schema.load(operation)
+        if errors:
+            results[index] = batch_result(op, 422, data.get('id'), errors)
+            continue
+
+        valid[op].append((index, data))
+
+    # Check existence and ownership of referenced todos and cards
+    items = [item for op_items in valid.values() for item in op_items]
+    owners = get_batch_owners(
+        {data['id'] for index, data in items if 'id' in data},
+        {data['card_id'] for index, data in items if data.get('card_id') is not None}
+    )
+
+    for op, op_items in valid.items():
+        accepted = []
+
+        for index, data in op_items:
+            errors = {}
+
+            if 'id' in data:
+                owner = owners.get(('todo', data['id']))
+                if owner is None:
+                    errors['id'] = ['Invalid Todo id.']
+                elif not owner == owner_id:
+                    errors['id'] = ['You are not the real owner of this Todo.']
+
+            if data.get('card_id') is not None:
+                owner = owners.get(('card', data['card_id']))
+                if owner is None:
+                    errors['card_id'] = ['Invalid parent card id.']
+                elif not owner == owner_id:
+                    errors['card_id'] = ['You do not have access to use this card.']
+
+            if errors:
+                results[index] = batch_result(op, 422, data.get('id'), errors)
+            else:
+                accepted.append((index, data))
+
+        valid[op] = accepted
+
+    table = Todo.__table__
+
+    # Cards whose counters change, before todos move or disappear
+    card_ids = {data.get('card_id') for op in ('create', 'update') for index, data in valid[op]}
+    todo_ids = {data['id'] for op in ('update', 'complete', 'delete') for index, data in valid[op]}
+    if todo_ids:
+        card_ids.update(card_id for card_id, in db.session.execute(
+            db.select([table.c.card_id]).where(table.c.id.in_(todo_ids)).distinct()))
+    card_ids.discard(None)
+
+    # Create
+    if valid['create']:
+        rows = [{
+            'owner_id': owner_id,
+            'title': data['title'],
+            'note': data.get('note'),
+            'due_date': data.get('due_date'),
+            'card_id': data.get('card_id'),
+            'completed': False,
+            'notified': False
+        } for index, data in valid['create']]
+
+        dialect = db.session.bind.dialect.name
+
+        if dialect == 'postgresql':
+            ids = [row.id for row in db.session.execute(
+                table.insert().values(rows).returning(table.c.id))]
+        elif dialect == 'sqlite':
+            # Without RETURNING read back the newest ids. SQLite has a single
+            # writer, no other transaction can insert until this one ends
+            db.session.execute(table.insert(), rows)
+            ids = [todo_id for todo_id, in db.session.query(Todo.id)
+                   .filter(Todo.owner_id == owner_id)
+                   .order_by(Todo.id.desc()).limit(len(rows))][::-1]
+        else:
+            # Concurrent transactions may commit ids in between, take the
+            # id of every insert instead
+            ids = [db.session.execute(table.insert(), row).inserted_primary_key[0]
+                   for row in rows]
+
+        for (index, data), todo_id in zip(valid['create'], ids):
+            results[index] = batch_result('create', 201, todo_id)
+
+    # Update, one executemany per set of changed columns
+    groups = {}
+    for index, data in valid['update']:
+        columns = tuple(sorted(key for key in data if not key == 'id'))
+        groups.setdefault(columns, []).append((index, data))
+
+    for columns, group in groups.items():
+        if columns:
+            values = {column: db.bindparam('_' + column) for column in columns}
+
+            # A new due date gets a new reminder
+            if 'due_date' in columns:
+                values['notified'] = False
+
+            db.session.execute(
+                table.update()
+                .where(table.c.id == db.bindparam('_id'))
+                .values(values),
+                [dict({'_' + column: data[column] for column in columns}, _id=data['id'])
+                 for index, data in group]
+            )
+
+        for index, data in group:
+            results[index] = batch_result('update', 200, data['id'])
+
+    # Complete
+    if valid['complete']:
+        ids = {data['id'] for index, data in valid['complete']}
+        db.session.execute(
+            table.update()
+            .where(table.c.id.in_(ids))
+            .values(completed=True, completed_at=datetime.now())
+        )
+
+        for index, data in valid['complete']:
+            results[index] = batch_result('complete', 200, data['id'])
+
+    # Delete
+    if valid['delete']:
+        ids = {data['id'] for index, data in valid['delete']}
+        Tombstone.bury('todo', Todo, Todo.id.in_(ids))
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+
+        for index, data in valid['delete']:
+            results[index] = batch_result('delete', 200, data['id'])
+
+    # Recount touched cards and the owner in place of per todo deltas
+    if card_ids:
+        todo_counters.recount('card', card_ids)
+    todo_counters.recount('user', [owner_id])
+
+    db.session.commit()
+
+    return results
+
+
+def batch_result(op, code, todo_id=None, errors=None):
+    """
+    Result of a single batch operation.
+    :param op: Operation name
+    :param code: Status code
+    :param todo_id: Todo ID
+    :param errors: Validation errors
+    :return: Result dictionary
+    """
+    return {
+        'op': op,
+        'id': todo_id,
+        'code': code,
+        'errors': errors
+    }
+
+
+def validate_batch_size(operations):
+    """
+    Check batch size limits.
+    :param operations: Operations list
+    """
+    if not operations:
+        raise ValidationError('At least one operation is required.')
+
+    if len(operations) > current_app.config['BATCH_SIZE_MAX']:
+        raise ValidationError('At most {0} operations are allowed.'.format(
+            current_app.config['BATCH_SIZE_MAX']))
+
+
+def claim_due_todos(start, end, after=None, limit=1000):
+    """
+    Claim the next keyset batch of open todos due for a reminder by flipping
+    their notified flag, so concurrent scanners never claim a todo twice.
+    The caller commits.
+    :param start: Earliest due date
+    :param end: Latest due date
+    :param after: Due date and id of the last claimed todo
+    :param limit: Batch size
+    :return: List of id, owner id, title and due date rows, empty when
+        nothing is due, None when other scanners kept claiming the batch
+    """
+    table = Todo.__table__
+    columns = [table.c.id, table.c.owner_id, table.c.title, table.c.due_date]
+
+    # Matches the ix_todos_due_date_id_unnotified partial index
+    pending = db.and_(db.not_(table.c.completed), db.not_(table.c.notified),
+                      table.c.due_date >= start, table.c.due_date <= end)
+    if after is not None:
+        pending = db.and_(pending, keyset_after(db.session.bind.dialect,
+                                                (table.c.due_date, table.c.id), after))
+
+    if db.session.bind.dialect.name == 'postgresql':
+        candidates = db.select([table.c.id]).where(pending) \
+            .order_by(table.c.due_date, table.c.id).limit(limit) \
+            .with_for_update(skip_locked=True)
+
+        rows = db.session.execute(
+            table.update()
+            .where(table.c.id.in_(candidates))
+            .values(notified=True)
+            .returning(*columns)
+        ).fetchall()
+
+        return sorted(rows, key=lambda row: (row.due_date, row.id))
+
+    # Without RETURNING select first, then claim. A lower row count means
+    # another scanner claimed some of them, so start the batch over.
+    for attempt in range(3):
+        rows = db.session.execute(
+            db.select(columns).where(pending)
+            .order_by(table.c.due_date, table.c.id).limit(limit)
+        ).fetchall()
+
+        if not rows:
+            return []
+
+        claimed = db.session.execute(
+            table.update()
+            .where(table.c.id.in_([row.id for row in rows]))
+            .where(db.not_(table.c.notified))
+            .values(notified=True)
+        ).rowcount
+
+        if claimed == len(rows):
+            return rows
+
+        db.session.rollback()
+
+    # Still due, the caller tries again
+    return None
+
+
+# Batch operation schemas
+class BatchCreateSchema(Schema):
+    title = fields.String(validate=[validate.Length(max=255)], required=True)
+    note = fields.String(allow_none=True)
+    due_date = fields.DateTime(allow_none=True)
+    card_id = fields.Integer(allow_none=True)
+
+
+class BatchUpdateSchema(Schema):
+    id = fields.Integer(required=True)
+    title = fields.String(validate=[validate.Length(max=255)])
+    note = fields.String(allow_none=True)
+    due_date = fields.DateTime(allow_none=True)
+    card_id = fields.Integer(allow_none=True)
+
+
+class BatchTodoIdSchema(Schema):
+    id = fields.Integer(required=True)
+
+
+batch_schemas = {
+    'create': BatchCreateSchema(),
+    'update': BatchUpdateSchema(),
+    'complete': BatchTodoIdSchema(),
+    'delete': BatchTodoIdSchema()
+}
+
+
 # Reusable args
 title = fields.String(validate=[validate.Length(max=255)],
                       required=True)
@@ -78,7 +401,7 @@ note = fields.String(missing=None, required=False)
 
 due_date = fields.DateTime(missing=None, required=False)
 
-card_id = fields.Integer(validate=[validate_card_existent, validate_ownership],
+card_id = fields.Integer(validate=validate_card_reference,
                          missing=None, required=False)
 
 
@@ -99,7 +422,12 @@ update_todo_args = {
 
 # Change Card ID args
 change_card_id_args = {
-    'card_id': fields.Integer(validate=[validate_card_existent, validate_ownership],
+    'card_id': fields.Integer(validate=validate_card_reference,
                               required=True)
 }
 
+# Batch args
+batch_todo_args = {
+    'operations': fields.List(fields.Dict(), validate=validate_batch_size,
+                              required=True)
+}
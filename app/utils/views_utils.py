@@ -1,4 +1,4 @@
-from flask import jsonify
+from flask import jsonify, json, Response, stream_with_context
 
 
 #  Create consistent json response
@@ -7,7 +7,8 @@ def json_response(
         code=200,
         errors=None,
         message='OK',
-        data=None
+        data=None,
+        **extra
         ):
     """
     Create consistent json response.
@@ -17,6 +18,7 @@ def json_response(
     :param errors: Response errors
     :param message: Response custom message
     :param data: Response data
+    :param extra: Additional envelope fields, e.g. next_cursor
     :return: JSON response
     """
 
@@ -27,6 +29,7 @@ def json_response(
         'message': message,
         'data': data
     }
+    response.update(extra)
 
     return jsonify(response), code
 
@@ -51,3 +54,54 @@ def json_response_with_error(
     """
 
     return json_response(status, code, errors, message, data)
+
+
+# Create consistent json response streamed from a row iterator
+def json_stream_response(
+        rows,
+        serialize=None,
+        status='success',
+        code=200,
+        errors=None,
+        message='OK',
+        **extra
+        ):
+    """
+    Create consistent JSON response, writing data items one at a time.
+
+    :param rows: Iterable of rows, e.g. a yield_per query
+    :param serialize: Function turning a row into JSON serializable data,
+        rows are written as they are if omitted
+    :param status: Response status
+    :param code: Response status code
+    :param errors: Response errors
+    :param message: Response custom message
+    :param extra: Additional envelope fields, e.g. next_cursor
+    :return: Streamed JSON response
+    """
+
+    envelope = [
+        ('status', status),
+        ('code', code),
+        ('errors', errors),
+        ('message', message)
+    ] + sorted(extra.items())
+
+    if serialize is None:
+        serialize = lambda row: row  # noqa: E731
+
+    def generate():
+        # Envelope fields come first so data can be written last
+        yield '{' + ''.join('{0}: {1}, '.format(json.dumps(key), json.dumps(value))
+                            for key, value in envelope)
+        yield '"data": ['
+
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps(serialize(row))
+            separator = ', '
+
+        yield ']}\n'
+
+    return Response(stream_with_context(generate()), status=code,
+                    mimetype='application/json')
@@ -6,18 +6,33 @@ from flask_login import login_required, current_user
 from app.extensions import db
 
 from app.models.card import Card
+from app.models.todo import Todo
 from app.utils.card_utils import (
     create_card_args,
-    validate_card_id,
+    load_card,
+    card_detail_options,
     update_card_args,
     update_parent_card_args,
-    get_todo_list
+    get_todo_list,
+    get_card_feeds,
+    get_card_summary,
+    get_card_etag_parts,
+    get_card_todos_etag_parts,
+    get_card_feeds_etag_parts,
+    get_card_summary_etag_parts
+)
+from app.utils.etag_utils import conditional_response
+from app.utils.routing_utils import use_replica
+
+from app.utils.pagination_utils import pagination_args, keyset_paginate
+from app.utils.views_utils import (
+    json_response,
+    json_response_with_error,
+    json_stream_response
 )
 
-from app.utils.views_utils import json_response, json_response_with_error
-
-from app.schemas.card_schemas import CardSchema, CardFeedsSchema
-from app.schemas.todo_schemas import TodoSchema
+from app.schemas.card_schemas import card_serializer
+from app.schemas.todo_schemas import todo_serializer
 
 
 class CardsView(FlaskView):
@@ -40,115 +55,136 @@ class CardsView(FlaskView):
         db.session.commit()
 
         # Respond with new card data
-        card_schema = CardSchema()
         return json_response(
             code=201,
             message='Successfully created a new card.',
-            data=[card_schema.dump(card).data]
+            data=[card_serializer.dump(card)]
         )
 
     @route('/<int:card_id>/', methods=['GET'])
     @login_required
-    @validate_card_id
-    def read(self, card_id):
+    @use_replica
+    @load_card(*card_detail_options)
+    @conditional_response(get_card_etag_parts)
+    def read(self, card_id, card):
         """
         Read single card.
         :param card_id: Card ID
+        :param card: Card
         :return: JSON response
         """
 
-        # Fetch card
-        card = Card.query.get(card_id)
-
-        # Define schema
-        card_schema = CardSchema()
-
         # Return output
         return json_response(
             code=200,
             message='Card enquiry was successful.',
-            data=card_schema.dump(card).data
+            data=card_serializer.dump(card)
         )
 
     @route('/<int:card_id>/todos/', methods=['GET'])
     @login_required
-    @validate_card_id
-    def todos(self, card_id):
+    @use_replica
+    @load_card(db.load_only('id', 'owner_id'))
+    @conditional_response(get_card_todos_etag_parts)
+    @use_args(pagination_args, locations=('query',))
+    def todos(self, args, card_id, card):
         """
         Read specific card todos.
+        :param args: Pagination args
         :param card_id: Card ID
+        :param card: Card
         :return: Card todo list
         """
 
         # Get args
         state = request.args.get(key='state', default='all', type=str)
 
-        # Fetch todo list
-        todos = get_todo_list(card_id, state)
-
-        # Define schema
-        todos_schema = TodoSchema(many=True)
+        # Fetch todo list page
+        todos, next_cursor = keyset_paginate(get_todo_list(card_id, state), Todo,
+                                             args['limit'], args['cursor'])
 
         # Return output
-        return json_response(
+        return json_stream_response(
+            todos,
+            todo_serializer.dump,
             code=200,
             message='Card todos enquiry was successful.',
-            data=todos_schema.dump(todos).data
+            next_cursor=next_cursor
         )
 
     @route('/feed/<int:card_id>/')
     @login_required
-    @validate_card_id
-    def card_feeds(self, card_id):
+    @use_replica
+    @load_card(db.load_only('id', 'owner_id', 'path'))
+    @conditional_response(get_card_feeds_etag_parts)
+    def card_feeds(self, card_id, card):
         """
         Read single card feeds.
         :param card_id: Card ID
+        :param card: Card
         :return: JSON Response
         """
 
-        # Fetch card
-        card = Card.query.get(card_id)
-
-        # Define schema
-        card_feeds_schema = CardFeedsSchema()
+        # Build card feeds
+        feeds = get_card_feeds(current_user.id, card_id)
 
         # Return output
         return json_response(
             code=200,
             message='Card feeds enquiry was successful.',
-            data=card_feeds_schema.dump(card).data
+            data=feeds
         )
 
     @route('/feed/', methods=['GET'])
     @login_required
+    @use_replica
+    @conditional_response(get_card_feeds_etag_parts)
     def cards_feed(self):
         """
         Fetch cards with child cards and todo list.
         :return: JSON response
         """
 
-        # Fetch cards
-        cards = Card.query.filter_by(parent_card=None, owner_id=current_user.id)
+        # Build top level card feeds
+        feeds = get_card_feeds(current_user.id)
 
-        # Define schema
-        cards_feed_schema = CardFeedsSchema(many=True)
+        # Return output
+        return json_stream_response(
+            feeds,
+            code=200,
+            message='Cards feed enquiry was successful.'
+        )
+
+    @route('/summary/', methods=['GET'])
+    @login_required
+    @use_replica
+    @conditional_response(get_card_summary_etag_parts)
+    def summary(self):
+        """
+        Fetch todo counters of the user and every card, without todo rows.
+        :return: JSON response
+        """
+
+        # Build counters summary
+        summary = get_card_summary(current_user.id)
 
         # Return output
         return json_response(
             code=200,
-            message='Cards feed enquiry was successful.',
-            data=cards_feed_schema.dump(cards).data
+            message='Cards summary enquiry was successful.',
+            data=summary
         )
 
     @route('/<int:card_id>/', methods=['PUT'])
     @login_required
-    @validate_card_id
+    @load_card()
     @use_args(update_card_args)
-    def update(self, args, card_id):
+    def update(self, args, card_id, card):
         """
         Update card info.
         :param args: Validated input
         :param card_id: Card ID
+        :param card: Card
         :return: Status with updated info
         """
 
@@ -158,7 +194,6 @@ class CardsView(FlaskView):
 
         # Update card
         changed = False
-        card = Card.query.get(card_id)
 
         if not title == card.title:
             card.title = title
@@ -173,44 +208,36 @@ class CardsView(FlaskView):
             card.save()
             db.session.commit()
 
-        # Define schema
-        card_schema = CardSchema()
-
         # Return output
         return json_response(
             code=200,
             message='Card information has been successfully updated.',
-            data=card_schema.dump(card).data
+            data=card_serializer.dump(card)
         )
 
     @route('/<int:card_id>/change_parent/', methods=['PUT'])
     @login_required
-    @validate_card_id
+    @load_card()
     @use_args(update_parent_card_args)
-    def change_parent(self, args, card_id):
+    def change_parent(self, args, card_id, card):
         """
         Change card parent ID.
         :param args: Validated input
         :param card_id: Card ID
+        :param card: Card
         :return: Status with new info
         """
 
-        # Fetch card
-        card = Card.query.get(card_id)
-
         if card.change_parent(args['parent_card_id']):
             # Save updated info
             card.save()
             db.session.commit()
 
-            # Define schema
-            card_schema = CardSchema()
-
             # Return output
             return json_response(
                 code=200,
                 message='Card information has been successfully updated.',
-                data=card_schema.dump(card).data
+                data=card_serializer.dump(card)
             )
 
         # Return error output
@@ -224,21 +251,22 @@ class CardsView(FlaskView):
 
     @route('/<int:card_id>/', methods=['DELETE'])
     @login_required
-    @validate_card_id
-    def delete(self, card_id):
+    @load_card(db.load_only('id', 'owner_id', 'path'))
+    def delete(self, card_id, card):
         """
         Delete card and associate child cards with todo list.
         :param card_id: Card ID
+        :param card: Card
         :return: Action status
         """
 
-        # Delete card
-        card = Card.query.get(card_id)
-        db.session.delete(card)
+        # Delete card subtree with todo list
+        deleted = card.delete_subtree()
         db.session.commit()
 
         # Return output
         return json_response(
             code=200,
             message='Card has been deleted successfully.',
+            data=deleted
         )
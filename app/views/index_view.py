@@ -1,4 +1,10 @@
-from flask_classful import FlaskView
+import hmac
+
+from flask import current_app, request
+from flask_classful import FlaskView, route
+
+from app.extensions import db, dispatcher, engine_tuning, token_cache
+from app.utils.views_utils import json_response, json_response_with_error
 
 
 class IndexView(FlaskView):
@@ -8,3 +14,38 @@ class IndexView(FlaskView):
         :return: Hello World
         """
         return 'Hello World!'
+
+    @route('/status/', methods=['GET'])
+    def status(self):
+        """
+        Connection pool, cache and task dispatch statistics for monitoring.
+        Only served to operators sending the configured Status-Token header.
+        :return: Statistics
+        """
+
+        # Hidden unless an operator token is configured
+        status_token = current_app.config.get('STATUS_TOKEN')
+        if not status_token:
+            return json_response_with_error(
+                message='Requested endpoint not found.'
+            )
+
+        token = request.headers.get('Status-Token', '')
+        if not hmac.compare_digest(token.encode(), status_token.encode()):
+            return json_response_with_error(
+                status='unauthorized',
+                code=401,
+                errors={
+                    'Status-Token': ['Invalid status token.']
+                },
+                message='Authentication failed.'
+            )
+
+        return json_response(
+            message='Status enquiry was successful.',
+            data={
+                'db_pool': engine_tuning.stats(db.engine),
+                'token_cache': token_cache.stats(),
+                'task_dispatch': dispatcher.stats()
+            }
+        )
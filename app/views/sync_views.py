@@ -0,0 +1,97 @@
+from flask import current_app
+from flask_classful import FlaskView, route
+from webargs.flaskparser import use_args
+from flask_login import login_required, current_user
+
+from app.models.card import Card
+from app.models.todo import Todo
+from app.models.tombstone import Tombstone
+
+from app.utils.sync_utils import (
+    SYNC_STREAMS,
+    sync_args,
+    get_watermark,
+    to_utc,
+    sync_page,
+    encode_sync_cursor,
+    decode_sync_cursor
+)
+from app.utils.views_utils import json_response
+
+from app.schemas.card_schemas import card_sync_serializer
+from app.schemas.todo_schemas import todo_serializer
+
+
+class SyncView(FlaskView):
+
+    @route('/', methods=['GET'])
+    @login_required
+    @use_args(sync_args, locations=('query',))
+    def index(self, args):
+        """
+        Fetch cards and todos changed since a watermark, with deleted IDs.
+
+        Rows modified at the watermark itself are sent again, clients should
+        upsert by ID. Each stream is paged on (date_modified, id), clients
+        follow next_cursor until it is null and then keep the watermark for
+        the next sync. Cards come without todo counters, they change
+        without a new date_modified, clients count the synced todos.
+
+        :param args: Sync args
+        :return: Changed records and a new watermark
+        """
+
+        if args['cursor']:
+            state = decode_sync_cursor(args['cursor'])
+        else:
+            # Take the new watermark before reading
+            since = to_utc(args['since'])
+            state = {
+                'watermark': get_watermark(),
+                'since': since,
+                'positions': dict.fromkeys(SYNC_STREAMS if since else ('cards', 'todos'))
+            }
+
+        limit = args['limit'] or current_app.config['SYNC_PAGE_SIZE']
+
+        streams = {
+            'cards': (Card, Card.query.filter(Card.owner_id == current_user.id)),
+            'todos': (Todo, Todo.query.filter(Todo.owner_id == current_user.id)),
+            'deleted': (Tombstone, Tombstone.query.filter(Tombstone.owner_id == current_user.id))
+        }
+
+        pages = dict.fromkeys(SYNC_STREAMS, ())
+        positions = {}
+
+        for stream, position in state['positions'].items():
+            model, query = streams[stream]
+            pages[stream], position = sync_page(query, model, state['since'], position, limit)
+
+            if position is not None:
+                positions[stream] = position
+
+        # Deleted records
+        deleted = {
+            'cards': [],
+            'todos': []
+        }
+
+        for tombstone in pages['deleted']:
+            deleted[tombstone.record_type + 's'].append(tombstone.record_id)
+
+        next_cursor = None
+        if positions:
+            next_cursor = encode_sync_cursor(dict(state, positions=positions))
+
+        # Return output
+        return json_response(
+            code=200,
+            message='Sync enquiry was successful.',
+            data={
+                'cards': card_sync_serializer.dump_many(pages['cards']),
+                'todos': todo_serializer.dump_many(pages['todos']),
+                'deleted': deleted,
+                'watermark': state['watermark'].isoformat()
+            },
+            next_cursor=next_cursor
+        )
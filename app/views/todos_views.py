@@ -8,18 +8,30 @@ from flask_login import login_required, current_user
 from app.extensions import db
 
 from app.models.todo import Todo
+from app.models.tombstone import Tombstone
 
 from app.utils.todo_utils import (
     create_todo_args,
-    validate_todo_id,
+    load_todo,
     update_todo_args,
     change_card_id_args,
-    get_todo_list
+    get_todo_list,
+    get_todo_etag_parts,
+    get_todo_list_etag_parts,
+    batch_todo_args,
+    apply_todo_batch
+)
+from app.utils.etag_utils import conditional_response
+from app.utils.routing_utils import use_replica
+
+from app.utils.pagination_utils import pagination_args, keyset_paginate
+from app.utils.views_utils import (
+    json_response,
+    json_response_with_error,
+    json_stream_response
 )
 
-from app.utils.views_utils import json_response, json_response_with_error
-
-from app.schemas.todo_schemas import TodoSchema
+from app.schemas.todo_schemas import todo_serializer
 
 class TodosView(FlaskView):
     @route('/', methods=['POST'])
@@ -40,69 +52,93 @@ class TodosView(FlaskView):
         db.session.commit()
 
         # Respond with new todo data
-        todo_schema = TodoSchema()
         return json_response(
             code=201,
             message='Successfully created a new todo.',
-            data=[todo_schema.dump(todo).data]
+            data=[todo_serializer.dump(todo)]
+        )
+
+    @route('/batch/', methods=['POST'])
+    @login_required
+    @use_args(batch_todo_args)
+    def batch(self, args):
+        """
+        Create, update, complete and delete todos in one request.
+
+        Operations run grouped by type, not in request order: all creates,
+        then updates, then completes, then deletes. Results are listed in
+        request order.
+
+        :param args: Batch operations
+        :return: Per operation results
+        """
+
+        results = apply_todo_batch(current_user.id, args['operations'])
+
+        return json_response(
+            code=200,
+            message='Todo batch has been processed.',
+            data=results
         )
 
     @route('/<int:todo_id>/', methods=['GET'])
     @login_required
-    @validate_todo_id
-    def read(self, todo_id):
+    @use_replica
+    @load_todo()
+    @conditional_response(get_todo_etag_parts)
+    def read(self, todo_id, todo):
         """
         Read single todo.
         :param todo_id: Todo ID
+        :param todo: Todo
         :return: JSON response
         """
 
-        # Fetch todo
-        todo = Todo.query.get(todo_id)
-
-        # Define schema
-        todo_schema = TodoSchema()
-
         # Return output
         return json_response(
             code=200,
             message='Todo enquiry was successful.',
-            data=todo_schema.dump(todo).data
+            data=todo_serializer.dump(todo)
         )
 
     @route('/', methods=['GET'])
     @login_required
-    def read_all(self):
+    @use_replica
+    @conditional_response(get_todo_list_etag_parts)
+    @use_args(pagination_args, locations=('query',))
+    def read_all(self, args):
         """
         Read all todo list.
+        :param args: Pagination args
         :return: Todo list data
         """
 
         # Get arg
         state = request.args.get(key='state', default='all', type=str)
 
-        # Fetch todo list
-        todos = get_todo_list(state)
-
-        # Define schema
-        todos_schema = TodoSchema(many=True)
+        # Fetch todo list page
+        todos, next_cursor = keyset_paginate(get_todo_list(state), Todo,
+                                             args['limit'], args['cursor'])
 
         # Return output
-        return json_response(
+        return json_stream_response(
+            todos,
+            todo_serializer.dump,
             code=200,
             message='Todo list enquiry was successful.',
-            data=todos_schema.dump(todos).data
+            next_cursor=next_cursor
         )
 
     @route('/<int:todo_id>/', methods=['PUT'])
     @login_required
-    @validate_todo_id
+    @load_todo()
     @use_args(update_todo_args)
-    def update(self, args, todo_id):
+    def update(self, args, todo_id, todo):
         """
         Update todo info.
         :param args: Validated input
         :param todo_id: Todo ID
+        :param todo: Todo
         :return: Updated information
         """
 
@@ -113,7 +149,6 @@ class TodosView(FlaskView):
 
         # Update todo
         changed = False
-        todo = Todo.query.get(todo_id)
 
         if title and not title == todo.title:
             todo.title = title
@@ -125,6 +160,7 @@ class TodosView(FlaskView):
 
         if due_date and not due_date == todo.due_date:
             todo.due_date = due_date
+            todo.notified = False
             changed = False
 
         # Save new record
@@ -132,29 +168,24 @@ class TodosView(FlaskView):
             todo.save()
             db.session.commit()
 
-        # Define schema
-        todo_schema = TodoSchema()
-
         # Return output
         return json_response(
             code=200,
             message='Todo information has been successfully updated.',
-            data=todo_schema.dump(todo).data
+            data=todo_serializer.dump(todo)
         )
 
     @route('/<int:todo_id>/mark_complete/', methods=['PUT'])
     @login_required
-    @validate_todo_id
-    def mark_complete(self, todo_id):
+    @load_todo()
+    def mark_complete(self, todo_id, todo):
         """
         Mark todo as completed.
         :param todo_id: Todo ID
+        :param todo: Todo
         :return: Action status
         """
 
-        # Fetch todo
-        todo = Todo.query.get(todo_id)
-
         # Mark complete
         todo.completed_at = datetime.now()
         todo.completed = True
@@ -169,47 +200,43 @@ class TodosView(FlaskView):
 
     @route('/<int:todo_id>/', methods=['PUT'])
     @login_required
-    @validate_todo_id
+    @load_todo()
     @use_args(change_card_id_args)
-    def change_card_id(self, args, todo_id):
+    def change_card_id(self, args, todo_id, todo):
         """
         Change todo card ID.
         :param args: Validated input
         :param todo_id: Todo ID
+        :param todo: Todo
         :return: Action status with new info
         """
 
-        # Fetch todo
-        todo = Todo.query.get(todo_id)
-
         # Update card ID
         if not args['card_id'] == todo.card_id:
             todo.card_id = args['card_id']
             todo.save()
             db.session.commit()
 
-        # Define schema
-        todo_schema = TodoSchema()
-
         # Return output
         return json_response(
             code=200,
             message='Todo information has been successfully updated.',
-            data=todo_schema.dump(todo).data
+            data=todo_serializer.dump(todo)
         )
 
     @route('/<int:todo_id>/', methods=['DELETE'])
     @login_required
-    @validate_todo_id
-    def delete(self, todo_id):
+    @load_todo()
+    def delete(self, todo_id, todo):
         """
         Delete todo.
         :param todo_id: Todo ID
+        :param todo: Todo
         :return Action status
         """
 
         # Delete todo
-        todo = Todo.query.get(todo_id)
+        Tombstone(todo.owner_id, 'todo', todo.id).save()
         db.session.delete(todo)
         db.session.commit()
 
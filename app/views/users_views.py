@@ -1,9 +1,9 @@
-from flask import jsonify
+from flask import current_app, jsonify
 from flask_classful import FlaskView, route
 from webargs.flaskparser import use_args
 from flask_login import login_required, current_user
 
-from app.extensions import db
+from app.extensions import db, dispatcher
 
 from app.models.user import User
 from app.utils import generate_secret_key
@@ -16,8 +16,11 @@ from app.utils.user_utils import (
     update_user_args
 )
 from app.utils.views_utils import json_response, json_response_with_error
+from app.utils.password_utils import HasherBusyError
+from app.utils.etag_utils import conditional_response
+from app.utils.routing_utils import use_replica
 
-from app.schemas.user_schemas import UserSchema
+from app.schemas.user_schemas import user_serializer
 
 
 class UsersView(FlaskView):
@@ -36,36 +39,34 @@ class UsersView(FlaskView):
         user = User(**args)
         user.secret_code = generate_secret_key(6, False)
         user.save()
-        db.session.commit()
 
-        # Send welcome email
-        from app.tasks.user_tasks import send_welcome_email
-        send_welcome_email.delay(user.email)
+        # Send welcome email and verification code once committed
+        from app.tasks.user_tasks import send_welcome_email, send_verification_code_email
+        dispatcher.enqueue(send_welcome_email, user.email)
+        dispatcher.enqueue(send_verification_code_email, user.email, user.secret_code)
 
-        # Send verification code
-        from app.tasks.user_tasks import send_verification_code_email
-        send_verification_code_email.delay(user.email, user.secret_code)
+        db.session.commit()
 
         # Respond with user data
-        user_schema = UserSchema()
         return json_response(
             code=201,
             message='Successfully created an user account.',
-            data=[user_schema.dump(user).data]
+            data=[user_serializer.dump(user)]
         )
 
     @route('/', methods=['GET'])
     @login_required
+    @use_replica
+    @conditional_response(lambda: [current_user.date_modified])
     def read(self):
         """
         Read user account information.
         :return: User account information.
         """
-        user_schema = UserSchema()
 
         return json_response(
             message='User account information enquiry was successful.',
-            data=[user_schema.dump(current_user).data]
+            data=[user_serializer.dump(current_user)]
         )
 
     @route('/', methods=['PUT'])
@@ -85,11 +86,9 @@ class UsersView(FlaskView):
         user.save()
         db.session.commit()
 
-        user_schema = UserSchema()
-
         return json_response(
             message='Account information has been successfully updated.',
-            data=[user_schema.dump(user).data]
+            data=[user_serializer.dump(user)]
         )
 
     @route('/request_code/', methods=['GET'])
@@ -110,9 +109,9 @@ class UsersView(FlaskView):
         code = user.generate_secret_code()
 
         if code:
-            # Send email with new verification code
+            # Send email with new verification code once committed
             from app.tasks.user_tasks import send_verification_code_email
-            send_verification_code_email.delay(email, code)
+            dispatcher.enqueue(send_verification_code_email, email, code)
 
             # Save new code
             user.save()
@@ -223,6 +222,16 @@ class UsersView(FlaskView):
 
         # Verify user password
         if user.verify_password(password):
+            # Upgrade password hash when the cost setting changed, a busy
+            # hasher leaves it to a later login
+            try:
+                if user.rehash_password(password):
+                    user.save()
+                    db.session.commit()
+            except HasherBusyError:
+                current_app.logger.warning('Hasher busy, password rehash of user %s skipped',
+                                           user.id)
+
             # Create token
             token = user.generate_token()
 
@@ -0,0 +1,321 @@
+import os
+import shutil
+import tempfile
+import time
+
+from datetime import datetime
+
+import click
+
+from flask import json
+from sqlalchemy.engine.url import make_url
+
+from app import create_app
+from app.extensions import db, query_instrumentation
+from app.models.card import Card
+from app.models.todo import Todo
+from app.models.user import User
+from seeds.bulk_seeder import BulkSeeder
+
+BENCH_PASSWORD = 'Benchmark1'
+
+
+def percentile(timings, rank):
+    """
+    Nearest rank percentile.
+
+    :param timings: Sorted timings
+    :param rank: Percentile rank, 0 - 100
+    :return: Timing
+    """
+    index = max(0, int(round(rank / 100.0 * len(timings) + 0.5)) - 1)
+
+    return timings[min(index, len(timings) - 1)]
+
+
+def endpoints(client, accounts):
+    """
+    Benchmarked endpoints, each one a name and a function issuing a request
+    for the n-th iteration.
+
+    :param client: Flask test client
+    :param accounts: List of email, token, card ids, todo ids and root card ids tuples
+    :return: List of name and function tuples
+    """
+
+    def account(n):
+        return accounts[n % len(accounts)]
+
+    def headers(n):
+        return {'Access-Token': account(n)[1]}
+
+    def authenticate(n):
+        return client.post('/api/users/authenticate/',
+                           data={'email': account(n)[0], 'password': BENCH_PASSWORD})
+
+    def cards_feed(n):
+        return client.get('/api/cards/feed/', headers=headers(n))
+
+    def card_feeds(n):
+        card_ids = account(n)[2]
+        return client.get('/api/cards/feed/{0}/'.format(card_ids[0]), headers=headers(n))
+
+    def todos_read_all(state):
+        def run(n):
+            return client.get('/api/todos/?state={0}'.format(state), headers=headers(n))
+        return run
+
+    def create(n):
+        card_ids = account(n)[2]
+        return client.post('/api/todos/', headers=headers(n),
+                           data={'title': 'Bench todo {0}'.format(n),
+                                 'card_id': card_ids[n % len(card_ids)]})
+
+    def mark_complete(n):
+        todo_ids = account(n)[3]
+        return client.put('/api/todos/{0}/mark_complete/'.format(todo_ids[n % len(todo_ids)]),
+                          headers=headers(n))
+
+    def change_parent(n):
+        # Move the last card back and forth between two root cards
+        card_ids, root_ids = account(n)[2], account(n)[4]
+        return client.put('/api/cards/{0}/change_parent/'.format(card_ids[-1]),
+                          headers=headers(n),
+                          data={'parent_card_id': root_ids[(n // len(accounts)) % 2]})
+
+    return [
+        ('authenticate', authenticate),
+        ('cards_feed', cards_feed),
+        ('card_feeds', card_feeds),
+        ('todos_all', todos_read_all('all')),
+        ('todos_completed', todos_read_all('completed')),
+        ('todos_delayed', todos_read_all('delayed')),
+        ('todos_incomplete', todos_read_all('incomplete')),
+        ('create', create),
+        ('mark_complete', mark_complete),
+        ('change_parent', change_parent)
+    ]
+
+
+def run_endpoint(fn, requests, warmup):
+    """
+    Time an endpoint.
+
+    :param fn: Request function
+    :param requests: Timed requests
+    :param warmup: Untimed requests
+    :return: Result dictionary
+    """
+
+    # Streamed responses run their queries while the body is read
+    for n in range(warmup):
+        fn(n).data
+
+    timings = []
+    queries = []
+    started = time.perf_counter()
+
+    for n in range(requests):
+        with query_instrumentation.record() as stats:
+            start = time.perf_counter()
+            response = fn(n)
+            response.data
+            timings.append(time.perf_counter() - start)
+
+        if response.status_code >= 400:
+            raise click.ClickException('Request failed with {0}: {1}'.format(
+                response.status_code, response.data[:200]))
+
+        queries.append(stats.count)
+
+    elapsed = time.perf_counter() - started
+    timings.sort()
+
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'throughput': round(requests / elapsed, 1),
+        'queries': max(queries)
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+
+    :param results: Benchmark results
+    :param baseline: Baseline results
+    :param threshold: Allowed p95 slowdown ratio
+    :return: List of regression messages
+    """
+
+    regressions = []
+
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+
+        if result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append('{0}: p95 {1} ms, baseline {2} ms'.format(
+                name, result['p95_ms'], base['p95_ms']))
+
+        if result['queries'] > base['queries']:
+            regressions.append('{0}: {1} queries, baseline {2}'.format(
+                name, result['queries'], base['queries']))
+
+    return regressions
+
+
+def run_benchmarks(database, users, depth, fan_out, todos, requests, warmup):
+    """
+    Build a bench database and time every endpoint against it.
+
+    :param database: Bench database URI
+    :param users: Number of users
+    :param depth: Card tree depth
+    :param fan_out: Child cards per card
+    :param todos: Todos per card
+    :param requests: Timed requests per endpoint
+    :param warmup: Untimed requests per endpoint
+    :return: Results keyed by endpoint name
+    """
+
+    # The replica bind would point at the app databases
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database,
+        'SQLALCHEMY_BINDS': None
+    })
+
+    with app.app_context():
+        click.echo('Building database: {0} users x depth {1} x fan out {2} x {3} todos'.format(
+            users, depth, fan_out, todos))
+        db.drop_all()
+        db.create_all()
+        BulkSeeder(users=users, depth=depth, fan_out=fan_out, todos=todos,
+                   password=BENCH_PASSWORD).run()
+
+        client = app.test_client()
+
+        # Log in every user
+        accounts = []
+        for user in User.query.order_by(User.id):
+            response = client.post('/api/users/authenticate/',
+                                   data={'email': user.email, 'password': BENCH_PASSWORD})
+            token = json.loads(response.data)['data']['access_token']
+
+            card_ids = [card_id for card_id, in
+                        db.session.query(Card.id).filter_by(owner_id=user.id).order_by(Card.id)]
+            todo_ids = [todo_id for todo_id, in
+                        db.session.query(Todo.id).filter_by(owner_id=user.id).order_by(Todo.id)]
+
+            # Cards are seeded level by level, so the first cards are roots
+            # and the last one is a leaf
+            root_ids = card_ids[:2]
+
+            accounts.append((user.email, token, card_ids, todo_ids, root_ids))
+
+        db.session.remove()
+
+        # Run benchmarks
+        results = {}
+        for name, fn in endpoints(client, accounts):
+            result = run_endpoint(fn, requests, warmup)
+            results[name] = result
+
+            click.echo('{0:<18} p50 {p50_ms:>8.2f} ms  p95 {p95_ms:>8.2f} ms  '
+                       'p99 {p99_ms:>8.2f} ms  {throughput:>8.1f} req/s  '
+                       '{queries:>3} queries'.format(name, **result))
+
+    return results
+
+
+@click.command()
+@click.option('--users', default=5, help='Number of users.')
+@click.option('--depth', default=3, help='Card tree depth.')
+@click.option('--fan-out', default=3, help='Child cards per card.')
+@click.option('--todos', default=10, help='Todos per card.')
+@click.option('--requests', default=200, help='Timed requests per endpoint.')
+@click.option('--warmup', default=10, help='Untimed requests per endpoint.')
+@click.option('--output', default='bench_results.json', help='Results file.')
+@click.option('--baseline', default='bench_baseline.json', help='Baseline file.')
+@click.option('--threshold', default=0.2, help='Allowed p95 slowdown, e.g. 0.2 for 20%.')
+@click.option('--save-baseline', is_flag=True, help='Store results as the new baseline.')
+@click.option('--database', default=None, envvar='BENCH_DATABASE_URI',
+              help='Dedicated bench database URI, dropped and rebuilt on every run. '
+                   'A temporary SQLite file is used if omitted.')
+def cli(users, depth, fan_out, todos, requests, warmup, output, baseline, threshold,
+        save_baseline, database):
+    """
+    Benchmark API endpoints against a generated database.
+    """
+
+    config = create_app().config
+
+    # Prevent command if config is set to production
+    if config['MODE'] == 'production':
+        click.echo('You cant perform this action in production.')
+        raise click.Abort()
+
+    if users < 1 or depth < 2 or fan_out < 2 or todos < 1:
+        raise click.BadParameter('Need at least one user and todo, a tree depth '
+                                 'of two and a fan out of two.')
+
+    # Never drop the app databases
+    configured = [config['SQLALCHEMY_DATABASE_URI']] + \
+        list((config.get('SQLALCHEMY_BINDS') or {}).values())
+    if database is not None and database in configured:
+        raise click.BadParameter('The bench database must not be an app database.',
+                                 param_hint='--database')
+
+    workdir = None
+    if database is None:
+        workdir = tempfile.mkdtemp(prefix='rdolist-bench-')
+        database = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    try:
+        results = run_benchmarks(database, users, depth, fan_out, todos, requests, warmup)
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'date': datetime.utcnow().isoformat(),
+        'config': {
+            'users': users,
+            'depth': depth,
+            'fan_out': fan_out,
+            'todos': todos,
+            'requests': requests,
+            'database': make_url(database).get_backend_name()
+        },
+        'results': results
+    }
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    click.echo('Results written to {0}'.format(output))
+
+    if save_baseline:
+        with open(baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        click.echo('Baseline written to {0}'.format(baseline))
+        return
+
+    if not os.path.exists(baseline):
+        click.echo('No baseline found at {0}'.format(baseline))
+        return
+
+    with open(baseline) as f:
+        stored = json.load(f)
+
+    if stored['config'] != report['config']:
+        click.echo('Warning: baseline was recorded with {0}'.format(stored['config']))
+
+    regressions = compare(results, stored['results'], threshold)
+    if regressions:
+        raise click.ClickException('Regressions over baseline:\n' + '\n'.join(regressions))
+
+    click.echo('No regressions over baseline.')
@@ -0,0 +1,74 @@
+import timeit
+
+from datetime import datetime, timedelta
+
+import click
+
+from flask import json
+
+from app import create_app
+
+# Create an app context for the schemas.
+app = create_app()
+
+
+@click.command()
+@click.option('--rows', default=10000, help='Rows per dump.')
+@click.option('--repeat', default=5, help='Timed runs per serializer.')
+def cli(rows, repeat):
+    """
+    Compare compiled serializers with marshmallow dumps.
+    :param rows: Rows per dump
+    :param repeat: Timed runs per serializer
+    """
+
+    from app.models.todo import Todo
+    from app.models.user import User
+    from app.schemas.todo_schemas import TodoSchema, todo_serializer
+    from app.schemas.user_schemas import UserSchema, user_serializer
+
+    with app.app_context():
+        now = datetime.utcnow()
+
+        # Build transient rows
+        todos = []
+        for i in range(rows):
+            todo = Todo(owner_id=1, title='Todo {0}'.format(i), note='Note',
+                        due_date=now + timedelta(hours=i), card_id=i % 50 or None)
+            todo.id = i + 1
+            todo.date_created = todo.date_modified = now
+            todo.completed = bool(i % 2)
+            todos.append(todo)
+
+        users = []
+        for i in range(rows):
+            user = User.__mapper__.class_manager.new_instance()
+            user.id = i + 1
+            user.first_name = 'First'
+            user.last_name = 'Last'
+            user.email = 'user{0}@example.com'.format(i)
+            user.date_created = user.date_modified = now
+            users.append(user)
+
+        benchmarks = [
+            ('TodoSchema', TodoSchema(many=True), todo_serializer, todos),
+            ('UserSchema', UserSchema(many=True), user_serializer, users)
+        ]
+
+        for name, schema, serializer, objs in benchmarks:
+            # Output must match byte for byte
+            expected = json.dumps(schema.dump(objs).data)
+            actual = json.dumps(serializer.dump_many(objs))
+            if expected != actual:
+                raise click.ClickException('{0} output differs.'.format(name))
+
+            marshmallow_time = min(timeit.repeat(lambda: schema.dump(objs),
+                                                 number=1, repeat=repeat))
+            compiled_time = min(timeit.repeat(lambda: serializer.dump_many(objs),
+                                              number=1, repeat=repeat))
+
+            click.echo('{0} ({1} rows, compiled={2}): marshmallow {3:.1f} ms, '
+                       'compiled {4:.1f} ms, {5:.1f}x faster'.format(
+                           name, rows, serializer.compiled,
+                           marshmallow_time * 1000, compiled_time * 1000,
+                           marshmallow_time / compiled_time))
@@ -1,8 +1,14 @@
+from datetime import datetime, timedelta
+
 import click
 
 from app import create_app
-from app.extensions import db
+from app.extensions import db, todo_counters
+from app.models.card import Card
+from app.models.todo import Todo
+from app.models.user import User
 from seeds.base_seeder import BaseSeeder
+from seeds.bulk_seeder import BulkSeeder
 
 # Create an app context for the database connection.
 app = create_app()
@@ -36,13 +42,32 @@ def init():
 
 @click.command()
 @click.argument('seeder_name', required=False)
-def seed(seeder_name):
+@click.option('--bulk', is_flag=True, help='Seed a large data set with bulk inserts.')
+@click.option('--users', default=1000, help='Bulk: number of users.')
+@click.option('--depth', default=3, help='Bulk: card tree depth.')
+@click.option('--fan-out', default=3, help='Bulk: child cards per card.')
+@click.option('--todos', default=20, help='Bulk: todos per card.')
+@click.option('--completed', default=30, help='Bulk: percentage of completed todos.')
+@click.option('--overdue', default=10, help='Bulk: percentage of overdue todos.')
+@click.option('--random-seed', default=0, help='Bulk: random seed.')
+@click.option('--batch-size', default=10000, help='Bulk: rows per insert.')
+def seed(seeder_name, bulk, users, depth, fan_out, todos, completed, overdue,
+         random_seed, batch_size):
     """
-    Seed the database from BaseSeeder.
+    Seed the database from BaseSeeder, or BulkSeeder with --bulk.
 
     :type seeder_name: Specific seeder name
     """
 
+    if bulk:
+        click.echo('Running bulk database seeder')
+
+        seeder = BulkSeeder(users=users, depth=depth, fan_out=fan_out, todos=todos,
+                            completed=completed, overdue=overdue, seed=random_seed,
+                            batch_size=batch_size)
+        seeder.run()
+        return
+
     # Run the seeder base class
     click.echo('Running database seeder')
 
@@ -62,6 +87,130 @@ def reset(ctx):
     ctx.invoke(seed)
 
 
+@click.command()
+def paths():
+    """
+    Rebuild card hierarchy paths.
+    """
+
+    # Columns created before the C collation, altering the type rebuilds the index
+    if db.engine.dialect.name == 'postgresql':
+        click.echo('Setting C collation on card paths')
+        db.session.execute('ALTER TABLE cards ALTER COLUMN path TYPE VARCHAR(512) COLLATE "C"')
+
+    click.echo('Rebuilding card paths')
+
+    total = Card.rebuild_paths()
+    db.session.commit()
+
+    click.echo('Updated {0} cards'.format(total))
+
+
+@click.command()
+@click.option('--batch-size', default=10000, help='Rows per statement.')
+def counters(batch_size):
+    """
+    Recompute card and user todo counters.
+    """
+
+    click.echo('Recounting todo counters')
+
+    for kind in ('card', 'user'):
+        total = todo_counters.recount(kind, batch_size=batch_size)
+        click.echo('Repaired {0} {1} rows'.format(total, kind))
+
+
+@click.command()
+@click.option('--offset', type=float,
+              help='Hours the database local time was ahead of UTC.')
+@click.option('--before',
+              help='Stored time of the switch to UTC defaults, e.g. 2020-01-31T12:00:00.')
+def timestamps(offset, before):
+    """
+    Shift creation and modification dates written in database local time
+    by CURRENT_TIMESTAMP to UTC, so keyset cursors order old and new rows
+    alike. On SQLite, where CURRENT_TIMESTAMP is UTC already, store them
+    with microseconds instead.
+    """
+
+    if db.engine.dialect.name == 'sqlite':
+        # Dates are compared as strings, 'HH:MM:SS' sorts before the
+        # 'HH:MM:SS.ffffff' of cursors within the same second
+        for model in (User, Card, Todo):
+            table = model.__table__
+
+            for column in ('date_created', 'date_modified'):
+                padded = db.session.execute(db.text(
+                    "UPDATE {0} SET {1} = strftime('%Y-%m-%d %H:%M:%f', {1}) || '000' "
+                    "WHERE {1} NOT LIKE '%.%'".format(table.name, column)
+                )).rowcount
+
+                click.echo('Added microseconds to {0} {1} of {2}'.format(
+                    padded, column, table.name))
+
+        db.session.commit()
+        return
+
+    if offset is None or before is None:
+        raise click.UsageError('--offset and --before are required.')
+
+    switched_at = datetime.strptime(before, '%Y-%m-%dT%H:%M:%S')
+    shift = timedelta(hours=offset)
+
+    for model in (User, Card, Todo):
+        table = model.__table__
+
+        # Set date_modified explicitly, its onupdate default would overwrite it
+        created = db.session.execute(
+            table.update()
+            .where(table.c.date_created < switched_at)
+            .values(date_created=table.c.date_created - shift,
+                    date_modified=table.c.date_modified)
+        ).rowcount
+        modified = db.session.execute(
+            table.update()
+            .where(table.c.date_modified < switched_at)
+            .values(date_modified=table.c.date_modified - shift)
+        ).rowcount
+
+        click.echo('Shifted {0} created and {1} modified dates of {2}'.format(
+            created, modified, table.name))
+
+    db.session.commit()
+
+
+@click.command()
+def replica():
+    """
+    Copy the primary SQLite database to the replica, for local testing.
+    """
+
+    if 'replica' not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        click.echo('No replica configured, set SQLALCHEMY_REPLICA_URI.')
+        raise click.Abort()
+
+    primary = db.get_engine(app)
+    replica_engine = db.get_engine(app, bind='replica')
+
+    if not primary.dialect.name == replica_engine.dialect.name == 'sqlite':
+        click.echo('Only SQLite databases can be copied.')
+        raise click.Abort()
+
+    click.echo('Copying primary database to replica')
+
+    source = primary.raw_connection()
+    target = replica_engine.raw_connection()
+    try:
+        source.connection.backup(target.connection)
+    finally:
+        source.close()
+        target.close()
+
+
 cli.add_command(init)
 cli.add_command(seed)
 cli.add_command(reset)
+cli.add_command(paths)
+cli.add_command(counters)
+cli.add_command(timestamps)
+cli.add_command(replica)
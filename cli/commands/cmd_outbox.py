@@ -0,0 +1,77 @@
+import time
+
+from datetime import datetime, timedelta
+
+import click
+
+from app import create_app
+from app.extensions import db, dispatcher
+from app.models.outbox import OutboxMessage
+
+# Create an app context for the database connection.
+app = create_app()
+db.app = app
+
+
+@click.group()
+def cli():
+    """
+    Relay and clean up outbox messages.
+    """
+    pass
+
+
+@click.command()
+@click.option('--batch-size', default=None, type=int, help='Messages per batch.')
+@click.option('--interval', default=None, type=float,
+              help='Seconds to sleep when no messages are pending.')
+@click.option('--once', is_flag=True, help='Stop once no messages are pending.')
+def relay(batch_size, interval, once):
+    """
+    Publish pending outbox messages to Celery.
+    """
+
+    interval = app.config['OUTBOX_RELAY_INTERVAL'] if interval is None else interval
+    total = 0
+
+    with app.app_context():
+        click.echo('Relaying outbox messages')
+
+        while True:
+            started = time.perf_counter()
+            count = dispatcher.relay(batch_size)
+
+            if count:
+                total += count
+                click.echo('  published {0} messages, {1:.0f} messages/sec'.format(
+                    count, count / (time.perf_counter() - started)))
+                continue
+
+            if once and dispatcher.breaker.allow():
+                break
+
+            time.sleep(interval)
+
+    click.echo('Published {0} messages'.format(total))
+
+
+@click.command()
+@click.option('--days', default=7, help='Keep messages dispatched in the last days.')
+def purge(days):
+    """
+    Delete dispatched outbox messages.
+    """
+
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    with app.app_context():
+        total = OutboxMessage.query \
+            .filter(OutboxMessage.dispatched_at < cutoff) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+
+    click.echo('Deleted {0} messages'.format(total))
+
+
+cli.add_command(relay)
+cli.add_command(purge)
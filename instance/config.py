@@ -1,6 +1,7 @@
 import os
 from os.path import join, dirname
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Load .env file
@@ -19,16 +20,114 @@ class Config(object):
 
     SECRET_KEY = os.getenv('SECRET_KEY')
 
+    # Operator token for the status endpoint, the endpoint is off without it
+    STATUS_TOKEN = os.getenv('STATUS_TOKEN')
+
+    # Access token cache
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+    TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+
+    # Password hashing
+    BCRYPT_LOG_ROUNDS = 12
+    BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', 4))
+    BCRYPT_QUEUE_SIZE = int(os.getenv('BCRYPT_QUEUE_SIZE', 32))
+    BCRYPT_TIMEOUT = int(os.getenv('BCRYPT_TIMEOUT', 10))
+
+    # Pagination
+    PAGE_SIZE = 100
+    PAGE_SIZE_MAX = 1000
+    YIELD_PER = 500
+
+    # Batch operations
+    BATCH_SIZE_MAX = 500
+
+    # Sync
+    SYNC_WATERMARK_LAG = 5
+    SYNC_PAGE_SIZE = 500
+    SYNC_RETENTION_DAYS = 30
+
     # DB
     SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Read replica, optional
+    SQLALCHEMY_BINDS = {
+        'replica': os.getenv('SQLALCHEMY_REPLICA_URI')
+    } if os.getenv('SQLALCHEMY_REPLICA_URI') else None
+    REPLICA_STICKY_SECONDS = 5
+
+    # DB engine, pool sized for server databases
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+
+    # SQLite pragmas, applied on every new connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,
+        'busy_timeout': 5000
+    }
+
+    # SQL instrumentation
+    SQL_INSTRUMENTATION = True
+    SQL_REPEAT_THRESHOLD = 5
+
     # Celery
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND')
     CELERY_ACCEPT_CONTENT = ['json']
     CELERY_TASK_SERIALIZER = 'json'
     CELERY_RESULT_SERIALIZER = 'json'
+    CELERYBEAT_SCHEDULE = {
+        'send-due-reminders': {
+            'task': 'app.tasks.todo_tasks.send_due_reminders',
+            'schedule': 60.0
+        },
+        'send-daily-digests': {
+            'task': 'app.tasks.todo_tasks.send_daily_digests',
+            'schedule': crontab(hour=7, minute=0)
+        },
+        'refresh-delayed-counters': {
+            'task': 'app.tasks.todo_tasks.refresh_delayed_counters',
+            'schedule': 60.0
+        },
+        'purge-tombstones': {
+            'task': 'app.tasks.todo_tasks.purge_tombstones',
+            'schedule': crontab(hour=3, minute=0)
+        }
+    }
+
+    # Due date reminders, in seconds
+    REMINDER_LEAD = 60 * 60
+    REMINDER_MAX_LAG = 24 * 60 * 60
+    REMINDER_SCAN_SECONDS = 50
+    REMINDER_BATCH_SIZE = 1000
+
+    # Daily digests
+    DIGEST_BATCH_SIZE = 1000
+    DIGEST_CHUNK_SIZE = 100
+    DIGEST_MAX_ITEMS = 20
+
+    # Todo counters, how far the first delayed refresh looks back, later
+    # refreshes continue from the previous one
+    COUNTER_REFRESH_WINDOW = 120
+
+    # Task dispatch, publishes Celery tasks after commit
+    TASK_DISPATCH_BATCH_SIZE = 100
+    TASK_DISPATCH_INTERVAL = 0.05
+    TASK_DISPATCH_BUFFER_SIZE = 10000
+    TASK_BREAKER_THRESHOLD = 3
+    TASK_BREAKER_COOLDOWN = 30
+
+    # Outbox relay, publishes what the dispatcher could not
+    OUTBOX_RELAY_BATCH_SIZE = 1000
+    OUTBOX_RELAY_DELAY = 10
+    OUTBOX_RELAY_INTERVAL = 1
 
     # Flask-Mail
     MAIL_SERVER = os.getenv('MAIL_SERVER')
@@ -39,12 +138,28 @@ class Config(object):
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
 
+    # Mail batching, per worker process. Tasks only share batches under a
+    # threads or gevent pool, prefork workers just reuse the connection
+    MAIL_BATCH_SIZE = 50
+    MAIL_BATCH_WINDOW = 0.1
+    MAIL_CONNECTION_IDLE = 30
+    MAIL_SEND_TIMEOUT = 60
+    MAIL_RETRY_DELAY = 30
+
 
 class DevelopmentConfig(Config):
     """Configurations for Development."""
     # App
     DEBUG = True
 
+    # DB engine
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 5,
+        'max_overflow': 5,
+        'pool_timeout': 10,
+        'pool_pre_ping': True
+    }
+
 
 class TestingConfig(Config):
     """Configurations for Testing"""
@@ -55,9 +170,26 @@ class TestingConfig(Config):
     TESTING = True
     DEBUG = True
 
+    # Password hashing
+    BCRYPT_LOG_ROUNDS = 4
+
     # DB
     SQLALCHEMY_DATABASE_URI = 'sqlite:///../test.db'
 
+    # DB engine
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 5,
+        'max_overflow': 5,
+        'pool_timeout': 10
+    }
+
+    # SQLite pragmas, durability does not matter for test data
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'busy_timeout': 5000
+    }
+
 
 class ProductionConfig(Config):
     """Configurations for Production."""
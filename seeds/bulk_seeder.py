@@ -0,0 +1,202 @@
+import random
+import string
+import time
+
+from datetime import datetime, timedelta
+
+from app.extensions import db, hasher, todo_counters
+from app.models.card import Card
+from app.models.todo import Todo
+from app.models.tombstone import Tombstone
+from app.models.user import User
+from .seeder import Seeder
+
+
+class BulkSeeder(Seeder):
+    def __init__(self, users=1000, depth=3, fan_out=3, todos=20, completed=30,
+                 overdue=10, seed=0, batch_size=10000, password='Passw0rd'):
+        """
+        Seed a large, reproducible data set with bulk inserts.
+
+        Every user gets `fan_out` root cards and every card `fan_out` child
+        cards down to `depth` levels, with `todos` todos on each card.
+
+        :param users: Number of users
+        :param depth: Card tree depth
+        :param fan_out: Child cards per card
+        :param todos: Todos per card
+        :param completed: Percentage of completed todos
+        :param overdue: Percentage of todos still open past their due date
+        :param seed: Random seed
+        :param batch_size: Rows per insert statement
+        :param password: Password shared by every user
+        """
+        self.users = users
+        self.depth = depth
+        self.fan_out = fan_out
+        self.todos = todos
+        self.completed = completed
+        self.overdue = overdue
+        self.seed = seed
+        self.batch_size = batch_size
+        self.password = password
+
+    def run(self):
+        """
+        Run BulkSeeder actions.
+        """
+
+        rng = random.Random(self.seed)
+        now = datetime.utcnow()
+
+        # Drop all collections
+        for model in (Tombstone, Todo, Card, User):
+            db.session.query(model).delete()
+        db.session.commit()
+
+        # Hash the shared password once
+        password = hasher.hash(self.password)
+        chars = string.ascii_letters + string.digits
+
+        users = ({
+            'id': user_id,
+            'first_name': 'User',
+            'last_name': str(user_id),
+            'email': 'user{0}@example.com'.format(user_id),
+            '_password': password,
+            'secret_key': ''.join(rng.choice(chars) for _ in range(12)),
+            'active': True,
+            'confirmed_at': now
+        } for user_id in range(1, self.users + 1))
+
+        self.insert(User, users, self.users)
+
+        # Cards are numbered level by level for each user, so paths and
+        # parent ids are known before inserting
+        cards_per_user = sum(self.fan_out ** level for level in range(1, self.depth + 1))
+
+        def cards():
+            card_id = 0
+            for user_id in range(1, self.users + 1):
+                parents = [(None, None)]
+                for level in range(self.depth):
+                    children = []
+                    for parent_id, parent_path in parents:
+                        for _ in range(self.fan_out):
+                            card_id += 1
+                            path = Card.build_path(card_id, parent_path)
+                            children.append((card_id, path))
+                            yield {
+                                'id': card_id,
+                                'owner_id': user_id,
+                                'parent_card_id': parent_id,
+                                'path': path,
+                                'title': 'Card {0}'.format(card_id),
+                                'note': None
+                            }
+                    parents = children
+
+        total_cards = self.users * cards_per_user
+        self.insert(Card, cards(), total_cards)
+
+        def todos():
+            todo_id = 0
+            for card_id in range(1, total_cards + 1):
+                owner_id = (card_id - 1) // cards_per_user + 1
+                for _ in range(self.todos):
+                    todo_id += 1
+                    chance = rng.random() * 100
+                    completed = chance < self.completed
+
+                    if completed:
+                        due_date = now - timedelta(days=rng.randint(1, 60))
+                    elif chance < self.completed + self.overdue:
+                        due_date = now - timedelta(hours=rng.randint(1, 24 * 30))
+                    else:
+                        due_date = now + timedelta(hours=rng.randint(1, 24 * 30))
+
+                    yield {
+                        'id': todo_id,
+                        'owner_id': owner_id,
+                        'card_id': card_id,
+                        'title': 'Todo {0}'.format(todo_id),
+                        'note': None,
+                        'due_date': due_date,
+                        'notified': False,
+                        'completed': completed,
+                        'completed_at': due_date if completed else None
+                    }
+
+        self.insert(Todo, todos(), total_cards * self.todos)
+
+        self.reset_sequences(User, Card, Todo)
+
+        # Bulk inserts skip the counter events
+        for kind in ('card', 'user'):
+            todo_counters.recount(kind, batch_size=self.batch_size)
+
+    def insert(self, model, rows, total):
+        """
+        Insert rows in batches and report progress.
+
+        :param model: Model class
+        :param rows: Row dictionaries
+        :param total: Expected number of rows
+        """
+
+        table = model.__table__
+        started = time.perf_counter()
+        count = 0
+        batch = []
+
+        def flush():
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+
+        for row in rows:
+            batch.append(row)
+
+            if len(batch) >= self.batch_size:
+                flush()
+                count += len(batch)
+                batch = []
+                self.progress(table.name, count, total, started)
+
+        if batch or not count:
+            flush()
+            count += len(batch)
+            self.progress(table.name, count, total, started)
+
+    @staticmethod
+    def progress(name, count, total, started):
+        """
+        Print insert progress.
+
+        :param name: Table name
+        :param count: Inserted rows
+        :param total: Expected number of rows
+        :param started: Start time
+        """
+        elapsed = time.perf_counter() - started or 1e-9
+
+        print('  {0}: {1}/{2} rows, {3:.0f} rows/sec'.format(
+            name, count, total, count / elapsed))
+
+    @staticmethod
+    def reset_sequences(*models):
+        """
+        Move id sequences past the explicit ids, PostgreSQL only.
+
+        :param models: Model classes
+        """
+
+        if db.engine.dialect.name != 'postgresql':
+            return
+
+        for model in models:
+            table = model.__tablename__
+            db.session.execute(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                "COALESCE((SELECT MAX(id) FROM {0}), 1))".format(table)
+            )
+        db.session.commit()
@@ -1,5 +1,7 @@
 from flask import json, url_for
 
+from app.extensions import query_instrumentation
+
 
 def validate_json_data(data, rules_list):
     """
@@ -43,3 +45,44 @@ def validate_login_required(client, route, request_type):
         ['errors', None, 1],
     ])
     assert data['errors']['Access-Token']
+
+
+def validate_query_budget(client, route, max_queries, headers=None, **values):
+    """
+    Test endpoint query budget.
+
+    :param client: Test app client
+    :param route: Route string
+    :param max_queries: Maximum statements the request may run
+    :param headers: Request headers
+    :param values: Route arguments and query string values
+    :return: Response
+    """
+
+    with query_instrumentation.query_budget(max_queries):
+        response = client.get(url_for(route, **values), headers=headers)
+
+        # Streamed responses run their queries while the body is read
+        response.data
+
+    return response
+
+
+def validate_query_plans(client, route, headers=None, **values):
+    """
+    Test endpoint queries use indexes instead of full table scans.
+
+    :param client: Test app client
+    :param route: Route string
+    :param headers: Request headers
+    :param values: Route arguments and query string values
+    :return: Response
+    """
+
+    with query_instrumentation.assert_indexed():
+        response = client.get(url_for(route, **values), headers=headers)
+
+        # Streamed responses run their queries while the body is read
+        response.data
+
+    return response
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from flask import json, url_for
+
+from app.extensions import todo_counters
+from app.models.card import Card
+from app.models.todo import Todo
+from app.models.user import User
+from app.models.watermark import Watermark
+from app.tasks.todo_tasks import refresh_delayed_counters
+
+
+def test_counter_updates_keep_date_modified(db):
+    user = User('Count', 'Tester', 'counters@example.com', 'Password1', active=True)
+    db.session.add(user)
+    db.session.commit()
+
+    card = Card(user.id, 'Counted')
+    db.session.add(card)
+    db.session.commit()
+
+    modified = card.date_modified
+
+    db.session.add(Todo(user.id, 'Counted todo', card_id=card.id))
+    db.session.commit()
+    db.session.refresh(card)
+
+    assert card.todos_total == 1
+    assert card.date_modified == modified
+
+    todo = Todo(user.id, 'Overdue todo', due_date=datetime.now() + timedelta(days=1),
+                card_id=card.id)
+    db.session.add(todo)
+    db.session.commit()
+
+    # Last refresh an hour ago, well beyond COUNTER_REFRESH_WINDOW
+    Watermark.set('delayed_counters', datetime.now() - timedelta(hours=1))
+    db.session.commit()
+
+    # Became overdue since, without a counter update
+    todos = Todo.__table__
+    db.session.execute(todos.update().where(todos.c.id == todo.id)
+                       .values(due_date=datetime.now() - timedelta(minutes=30)))
+    db.session.commit()
+
+    assert refresh_delayed_counters.run() == 2
+    db.session.refresh(card)
+
+    assert card.todos_delayed == 1
+    assert card.date_modified == modified
+    assert Watermark.get('delayed_counters') > datetime.now() - timedelta(minutes=1)
+    assert refresh_delayed_counters.run() == 0
+
+    assert todo_counters.recount('card', [card.id]) == 0
+
+
+def test_summary_etag_follows_counters(db, client):
+    user = User('Etag', 'Tester', 'etags@example.com', 'Password1', active=True)
+    db.session.add(user)
+    db.session.commit()
+
+    card = Card(user.id, 'Tagged')
+    db.session.add(card)
+    db.session.commit()
+
+    todo = Todo(user.id, 'Tagged todo', card_id=card.id)
+    db.session.add(todo)
+    db.session.commit()
+
+    response = client.post(url_for('UsersView:authenticate'),
+                           data={'email': user.email, 'password': 'Password1'})
+    headers = {'Access-Token': json.loads(response.data)['data']['access_token']}
+
+    response = client.get(url_for('CardsView:summary'), headers=headers)
+    etag = response.headers['ETag']
+
+    assert response.status_code == 200
+    assert json.loads(response.data)['data']['todos_completed'] == 0
+
+    response = client.put(url_for('TodosView:mark_complete', todo_id=todo.id), headers=headers)
+
+    assert response.status_code == 200
+
+    response = client.get(url_for('CardsView:summary'),
+                          headers=dict(headers, **{'If-None-Match': etag}))
+    data = json.loads(response.data)['data']
+
+    assert response.status_code == 200
+    assert data['todos_completed'] == 1
+    assert data['cards'][0]['todos_completed'] == 1
@@ -0,0 +1,170 @@
+import asyncore
+import smtpd
+import threading
+import time
+
+import pytest
+
+from app.extensions import mail_batcher
+from app.utils.email_utils import send_email, send_email_batch
+from app.utils.mail_utils import MailBatcher, MailPendingError, build_message
+
+SENDER = 'noreply@example.com'
+
+
+class SMTPStandIn(smtpd.SMTPServer):
+    """
+    Local SMTP server recording connections and recipients, rejecting
+    recipients starting with 'bad'.
+    """
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('localhost', 0), None)
+
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        self.received = []
+
+    def handle_accepted(self, conn, addr):
+        self.connections += 1
+        return smtpd.SMTPServer.handle_accepted(self, conn, addr)
+
+    def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+        if any(recipient.startswith('bad') for recipient in rcpttos):
+            return '550 Recipient rejected'
+
+        self.received.extend(rcpttos)
+
+
+@pytest.fixture(scope='module')
+def smtp_server():
+    server = SMTPStandIn()
+    thread = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.05}, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.close()
+
+
+@pytest.fixture(scope='function')
+def smtp(app, smtp_server, monkeypatch):
+    """
+    Point Flask-Mail at the stand-in and reset its records.
+    """
+    state = app.extensions['mail']
+    monkeypatch.setattr(state, 'server', 'localhost')
+    monkeypatch.setattr(state, 'port', smtp_server.port)
+    monkeypatch.setattr(state, 'suppress', False)
+
+    smtp_server.connections = 0
+    smtp_server.received = []
+
+    return smtp_server
+
+
+def message(recipient):
+    return build_message('Subject', [recipient], 'Text', '<p>Html</p>', SENDER)
+
+
+def test_batch_uses_one_connection(app, smtp):
+    batcher = MailBatcher(app)
+
+    errors = batcher.send([message('user{0}@example.com'.format(n)) for n in range(20)], 10)
+
+    assert errors == [None] * 20
+    assert len(smtp.received) == 20
+    assert smtp.connections == 1
+    assert batcher.connections == 1
+
+
+def test_rejected_recipient_fails_alone(app, smtp):
+    batcher = MailBatcher(app)
+
+    errors = batcher.send([message('first@example.com'), message('bad@example.com'),
+                           message('last@example.com')], 10)
+
+    assert errors[0] is None and errors[2] is None
+    assert errors[1] is not None
+    assert smtp.received == ['first@example.com', 'last@example.com']
+
+
+def test_reconnects_after_dropped_connection(app, smtp):
+    batcher = MailBatcher(app)
+
+    assert batcher.send([message('before@example.com')], 10) == [None]
+
+    # Drop the pooled connection under the batcher
+    batcher._connection.host.close()
+
+    assert batcher.send([message('after@example.com')], 10) == [None]
+    assert smtp.received == ['before@example.com', 'after@example.com']
+    assert batcher.connections == 2
+
+
+def test_pending_mail_is_not_retried(app, smtp, monkeypatch):
+    sent = []
+    send = mail_batcher.send
+
+    # Stop waiting right away, the messages are still queued
+    def counting_send(messages, timeout=None):
+        sent.extend(messages)
+        errors = send(messages, 0)
+
+        assert all(isinstance(error, MailPendingError) for error in errors)
+        return errors
+
+    monkeypatch.setattr(mail_batcher, 'send', counting_send)
+
+    result = send_email_batch.apply(args=([{
+        'subject': 'Subject',
+        'recipients': ['pending@example.com'],
+        'text_body': 'Text',
+        'html_body': '<p>Html</p>',
+        'sender': SENDER
+    }],))
+    send_email.run('Subject', ['single@example.com'], 'Text', '<p>Html</p>', SENDER)
+
+    assert result.successful()
+    assert len(sent) == 2
+
+    # The batcher still delivers both, once
+    deadline = time.time() + 5
+    while len(smtp.received) < 2 and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert sorted(smtp.received) == ['pending@example.com', 'single@example.com']
+
+
+def test_batcher_requires_init_app():
+    with pytest.raises(RuntimeError):
+        MailBatcher().send([message('lost@example.com')], 10)
+
+
+def test_sender_survives_batch_errors(app, smtp):
+    batcher = MailBatcher(app)
+
+    def broken(message):
+        raise RuntimeError('broken')
+
+    # An error escaping the batch fails its messages, not the sender
+    batcher._deliver = broken
+    error, = batcher.send([message('failed@example.com')], 10)
+    del batcher._deliver
+
+    assert isinstance(error, RuntimeError)
+    assert batcher.send([message('next@example.com')], 10) == [None]
+
+
+def test_dead_sender_is_restarted(app, smtp):
+    batcher = MailBatcher(app)
+    assert batcher.send([message('first@example.com')], 10) == [None]
+
+    # Replace the sender with a finished thread
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    batcher._thread = dead
+
+    assert batcher.send([message('second@example.com')], 10) == [None]
+    assert smtp.received == ['first@example.com', 'second@example.com']
@@ -0,0 +1,22 @@
+from app.models.outbox import OutboxMessage
+
+
+def test_message_id():
+    assert OutboxMessage.message_id('outbox-12') == 12
+    assert OutboxMessage.message_id('outbox-x') is None
+    assert OutboxMessage.message_id('9b1deb4d') is None
+    assert OutboxMessage.message_id(None) is None
+
+
+def test_claim_once(db):
+    message = OutboxMessage('app.tasks.user_tasks.send_welcome_email', ['a@example.com'])
+    db.session.add(message)
+    db.session.commit()
+
+    assert OutboxMessage.claim(message.id)
+    assert not OutboxMessage.claim(message.id)
+
+    # A failed task gives the claim back for its retry
+    OutboxMessage.release(message.id)
+
+    assert OutboxMessage.claim(message.id)
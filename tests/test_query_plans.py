@@ -0,0 +1,93 @@
+import pytest
+
+from flask import json
+
+from app.models.card import Card
+from app.models.todo import Todo
+from app.models.user import User
+
+from tests import validate_query_plans
+
+PASSWORD = 'Password1'
+
+
+@pytest.fixture(scope='module')
+def account(db, app):
+    """
+    Create a user with a card tree and todos, and log in.
+
+    :param db: Pytest fixture
+    :param app: Pytest fixture
+    :return: Access token headers and card IDs
+    """
+
+    user = User('Plan', 'Tester', 'plans@example.com', PASSWORD, active=True)
+    db.session.add(user)
+    db.session.commit()
+
+    # Two levels of cards below a root, each with a few todos
+    root = Card(user.id, 'Root')
+    db.session.add(root)
+    db.session.commit()
+
+    cards = [root]
+    for parent in (root, root):
+        child = Card(user.id, 'Child', parent_card_id=parent.id)
+        db.session.add(child)
+        db.session.commit()
+        cards.append(child)
+
+    grandchild = Card(user.id, 'Grandchild', parent_card_id=cards[1].id)
+    db.session.add(grandchild)
+    db.session.commit()
+    cards.append(grandchild)
+
+    for card in cards:
+        for n in range(3):
+            db.session.add(Todo(user.id, 'Todo {0}'.format(n), card_id=card.id))
+    db.session.commit()
+
+    response = app.test_client().post('/api/users/authenticate/',
+                                      data={'email': user.email, 'password': PASSWORD})
+    token = json.loads(response.data)['data']['access_token']
+
+    return {'Access-Token': token}, [card.id for card in cards]
+
+
+def test_cards_feed_query_plans(client, account):
+    headers, card_ids = account
+
+    response = validate_query_plans(client, 'CardsView:cards_feed', headers=headers)
+
+    assert response.status_code == 200
+
+
+def test_card_feeds_query_plans(client, account):
+    headers, card_ids = account
+
+    response = validate_query_plans(client, 'CardsView:card_feeds', headers=headers,
+                                    card_id=card_ids[0])
+    data = json.loads(response.data)
+
+    assert response.status_code == 200
+    assert data['data']
+
+
+@pytest.mark.parametrize('state', ['all', 'completed', 'incomplete', 'delayed'])
+def test_card_todos_query_plans(client, account, state):
+    headers, card_ids = account
+
+    response = validate_query_plans(client, 'CardsView:todos', headers=headers,
+                                    card_id=card_ids[1], state=state)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('state', ['all', 'completed', 'incomplete', 'delayed'])
+def test_todos_read_all_query_plans(client, account, state):
+    headers, card_ids = account
+
+    response = validate_query_plans(client, 'TodosView:read_all', headers=headers,
+                                    state=state)
+
+    assert response.status_code == 200
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from app.models.outbox import OutboxMessage
+from app.models.todo import Todo
+from app.models.user import User
+from app.tasks.todo_tasks import send_due_reminders
+
+
+def test_due_reminders_claim_once(db, monkeypatch, app):
+    # Small batches so the scan continues from a keyset position
+    monkeypatch.setitem(app.config, 'REMINDER_BATCH_SIZE', 2)
+
+    user = User('Remind', 'Tester', 'reminders@example.com', 'Password1', active=True)
+    db.session.add(user)
+    db.session.commit()
+
+    now = datetime.now()
+    due = [Todo(user.id, 'Due {0}'.format(n), due_date=now + timedelta(minutes=n))
+           for n in range(5)]
+    later = Todo(user.id, 'Later', due_date=now + timedelta(days=2))
+    stale = Todo(user.id, 'Stale', due_date=now - timedelta(days=2))
+    done = Todo(user.id, 'Done', due_date=now + timedelta(minutes=1))
+    done.completed = True
+
+    db.session.add_all(due + [later, stale, done])
+    db.session.commit()
+
+    messages = OutboxMessage.query.count()
+
+    stats = send_due_reminders.run()
+
+    assert stats['todos'] >= len(due)
+    assert OutboxMessage.query.count() > messages
+
+    db.session.expire_all()
+
+    assert all(todo.notified for todo in due)
+    assert not later.notified
+    assert not stale.notified
+    assert not done.notified
+
+    # Everything due was claimed
+    assert send_due_reminders.run()['todos'] == 0
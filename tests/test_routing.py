@@ -0,0 +1,39 @@
+from flask import _request_ctx_stack
+
+from app.extensions import db as _db
+from app.utils.routing_utils import LAST_WRITE_COOKIE, LAST_WRITE_HEADER
+
+
+def test_recently_wrote_in_request(app):
+    with app.test_request_context('/'):
+        assert not _db.recently_wrote(1)
+
+        _request_ctx_stack.top.last_writer = 1
+
+        assert _db.recently_wrote(1)
+        assert not _db.recently_wrote(2)
+
+
+def test_recently_wrote_from_header(app):
+    with app.test_request_context('/'):
+        marker = _db._last_write_serializer().dumps(1)
+
+    with app.test_request_context('/', headers={LAST_WRITE_HEADER: marker}):
+        assert _db.recently_wrote(1)
+        assert not _db.recently_wrote(2)
+
+    with app.test_request_context('/', headers={'Cookie': '{0}={1}'.format(LAST_WRITE_COOKIE,
+                                                                          marker)}):
+        assert _db.recently_wrote(1)
+
+
+def test_recently_wrote_rejects_forged_and_expired(monkeypatch, app):
+    with app.test_request_context('/', headers={LAST_WRITE_HEADER: 'forged'}):
+        assert not _db.recently_wrote(1)
+
+    with app.test_request_context('/'):
+        marker = _db._last_write_serializer().dumps(1)
+
+    monkeypatch.setitem(app.config, 'REPLICA_STICKY_SECONDS', -1)
+    with app.test_request_context('/', headers={LAST_WRITE_HEADER: marker}):
+        assert not _db.recently_wrote(1)
@@ -0,0 +1,29 @@
+from flask import json
+
+
+def test_status_hidden_without_token(monkeypatch, app, client):
+    monkeypatch.setitem(app.config, 'STATUS_TOKEN', None)
+
+    response = client.get('/status/')
+
+    assert response.status_code == 404
+
+
+def test_status_requires_token(monkeypatch, app, client):
+    monkeypatch.setitem(app.config, 'STATUS_TOKEN', 'operator')
+
+    response = client.get('/status/', headers={'Status-Token': 'wrong'})
+    data = json.loads(response.data)
+
+    assert response.status_code == 401
+    assert data['errors']['Status-Token']
+
+
+def test_status_with_token(monkeypatch, app, db, client):
+    monkeypatch.setitem(app.config, 'STATUS_TOKEN', 'operator')
+
+    response = client.get('/status/', headers={'Status-Token': 'operator'})
+    data = json.loads(response.data)
+
+    assert response.status_code == 200
+    assert 'db_pool' in data['data']
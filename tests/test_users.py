@@ -0,0 +1,23 @@
+from flask import json, url_for
+
+from app.extensions import hasher
+from app.models.user import User
+from app.utils.password_utils import HasherBusyError
+
+
+def test_authenticate_skips_rehash_when_hasher_busy(db, client, monkeypatch):
+    user = User('Busy', 'Tester', 'busy@example.com', 'Password1', active=True)
+    db.session.add(user)
+    db.session.commit()
+
+    def busy(password):
+        raise HasherBusyError()
+
+    monkeypatch.setattr(hasher, 'needs_rehash', lambda password_hash: True)
+    monkeypatch.setattr(hasher, 'hash', busy)
+
+    response = client.post(url_for('UsersView:authenticate'),
+                           data={'email': user.email, 'password': 'Password1'})
+
+    assert response.status_code == 200
+    assert json.loads(response.data)['data']['access_token']